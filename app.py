@@ -1,7 +1,15 @@
 import streamlit as st
-from langgraph_tool_backend import chatbot, retrieve_all_threads
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 import uuid
+import os
+
+if os.getenv("CHATBOT_SERVER_URL"):
+    # Thin client of server.py: the graph runs in the server's worker processes
+    from chat_client import retrieve_all_threads, get_turn_trace, load_history_page, search_history, stream_turn_events
+else:
+    from langgraph_tool_backend import retrieve_all_threads, get_turn_trace, load_history_page, search_history, stream_turn_events
+
+# Threads listed per sidebar page; older ones load with "Load more conversations"
+THREAD_PAGE_SIZE = 50
 
 # ===================Thread_id=========================
 def generate_thread_id():
@@ -13,25 +21,49 @@ def reset_chat():
     st.session_state["thread_id"] = thread_id
     add_thread(st.session_state["thread_id"])
     st.session_state["message_history"] = []  
+    st.session_state["history_start"] = 0
     st.session_state["current_status"] = "Ready"
     st.session_state["current_tool"] = "None"
 
 def add_thread(thread_id):
+    # The list is newest first, like the thread index
     if thread_id not in st.session_state["chat_threads"]:
-        st.session_state["chat_threads"].append(thread_id)
+        st.session_state["chat_threads"].insert(0, thread_id)
+
+def load_more_threads():
+    page = retrieve_all_threads(limit=THREAD_PAGE_SIZE, offset=st.session_state["threads_offset"])
+    st.session_state["threads_offset"] += len(page)
+    st.session_state["threads_exhausted"] = len(page) < THREAD_PAGE_SIZE
+    listed = {str(t) for t in st.session_state["chat_threads"]}
+    st.session_state["chat_threads"].extend(t for t in page if str(t) not in listed)
 
 def load_thread(thread_id):
-    return chatbot.get_state(config={"configurable": {"thread_id": thread_id}}).values["messages"]
+    # Newest page only; older pages are fetched with "Load older messages"
+    return load_history_page(thread_id)
+
+def open_thread(thread_id):
+    # Reuse the sidebar's entry so a thread opened from search is not listed twice
+    thread_id = next((t for t in st.session_state["chat_threads"] if str(t) == str(thread_id)), thread_id)
+    add_thread(thread_id)
+    st.session_state["thread_id"] = thread_id
+    messages, start = load_thread(thread_id)
+    st.session_state["message_history"] = messages
+    st.session_state["history_start"] = start
 
 # =====================Session Setups=======================
 if "message_history" not in st.session_state:
     st.session_state["message_history"] = []
 
+if "history_start" not in st.session_state:
+    st.session_state["history_start"] = 0
+
 if "thread_id" not in st.session_state:
     st.session_state["thread_id"] = generate_thread_id()
 
 if "chat_threads" not in st.session_state:
-    st.session_state["chat_threads"] = retrieve_all_threads()
+    st.session_state["chat_threads"] = []
+    st.session_state["threads_offset"] = 0
+    load_more_threads()
 
 if "current_status" not in st.session_state:
     st.session_state["current_status"] = "Ready"
@@ -90,22 +122,32 @@ if st.sidebar.button("New Chat"):
 
 st.sidebar.header("Conversation History")
 
+# Full-text search over every conversation; a hit opens its thread
+search_text = st.sidebar.text_input("Search conversations")
+if search_text.strip():
+    hits = search_history(search_text)
+    if not hits:
+        st.sidebar.caption("No matches")
+    for i, hit in enumerate(hits):
+        if st.sidebar.button(f"{hit.get('title') or hit['thread_id']} — {hit['snippet']}", key=f"search_{i}_{hit['thread_id']}"):
+            open_thread(hit["thread_id"])
+
 for thread_id in st.session_state["chat_threads"]:
     if st.sidebar.button(str(thread_id), key=str(thread_id)):
-        st.session_state["thread_id"] = thread_id
-        messages  = load_thread(thread_id)
-
-        temp_history = []
-        for msg in messages:
-            if isinstance(msg, HumanMessage):
-                role="user"
-            else:
-                role="assistant"
-            temp_history.append({"role": role, "content": msg.content})
-        
-        st.session_state["message_history"] = temp_history
+        open_thread(thread_id)
+
+if not st.session_state["threads_exhausted"] and st.sidebar.button("Load more conversations"):
+    load_more_threads()
+    st.rerun()
 
 # =====================Main UI======================
+# Older pages load on demand so long threads render only their newest messages
+if st.session_state["history_start"] > 0:
+    if st.button("⬆️ Load older messages"):
+        older, start = load_history_page(st.session_state["thread_id"], end=st.session_state["history_start"])
+        st.session_state["message_history"] = older + st.session_state["message_history"]
+        st.session_state["history_start"] = start
+
 # Display chat history
 for message in st.session_state["message_history"]:
     with st.chat_message(message["role"]):
@@ -133,41 +175,37 @@ if user_input:
     # Stream AI response - ONLY show AI messages with status updates
     with st.chat_message("assistant"):
         def ai_only_stream():
-            for message_chunk, metadata in chatbot.stream(
-                {"messages": [HumanMessage(content=user_input)]},
-                config=CONFIG,
-                stream_mode="messages"
-            ):
+            for event in stream_turn_events(user_input, CONFIG):
                 # Update status based on what the agent is doing
-                if isinstance(message_chunk, AIMessage):
-                    if hasattr(message_chunk, 'tool_calls') and message_chunk.tool_calls:
-                        # Agent is using a tool
-                        tool_call = message_chunk.tool_calls[0]
-                        tool_name = tool_call['name']
-                        
-                        if tool_name == "DuckDuckGoSearchRun":
-                            st.session_state["current_status"] = "Searching"
-                            st.session_state["current_tool"] = "Web Search"
-                        elif tool_name == "calculator_tool":
-                            st.session_state["current_status"] = "Calculating" 
-                            st.session_state["current_tool"] = "Calculator"
-                        elif tool_name == "get_stock_price":
-                            st.session_state["current_status"] = "Fetching Stock"
-                            st.session_state["current_tool"] = "Stock Data"
-                    
-                    else:
-                        # Agent is thinking/processing
-                        st.session_state["current_status"] = "Processing"
-                        st.session_state["current_tool"] = "None"
-                
-                elif isinstance(message_chunk, ToolMessage):
-                    # Tool execution completed
+                if event["type"] == "tool_started":
+                    # Agent is using a tool
+                    tool_name = event["name"]
+
+                    if tool_name == "duckduckgo_search":
+                        st.session_state["current_status"] = "Searching"
+                        st.session_state["current_tool"] = "Web Search"
+                    elif tool_name == "calculator_tool":
+                        st.session_state["current_status"] = "Calculating" 
+                        st.session_state["current_tool"] = "Calculator"
+                    elif tool_name in ("get_stock_price", "get_stock_quotes"):
+                        st.session_state["current_status"] = "Fetching Stock"
+                        st.session_state["current_tool"] = "Stock Data"
+
+                elif event["type"] == "tool_result":
+                    # Tool execution completed; its output is shown like the original AI messages
                     st.session_state["current_status"] = "Processing"
                     st.session_state["current_tool"] = "None"
-                
-                # Yield only AI message content for display
-                if isinstance(message_chunk, AIMessage) and message_chunk.content:
-                    yield message_chunk.content
+                    if event["content"]:
+                        yield event["content"]
+
+                elif event["type"] == "token":
+                    # Agent is thinking/processing
+                    st.session_state["current_status"] = "Processing"
+                    yield event["content"]
+
+                elif event["type"] == "error":
+                    # Turn refused: this conversation is still busy with another message
+                    yield f"⚠️ {event['error']}"
 
             # Final status update when done
             st.session_state["current_status"] = "Ready"
@@ -177,4 +215,8 @@ if user_input:
         ai_response = st.write_stream(ai_only_stream())
     
     # Save the AI response to history
-    st.session_state["message_history"].append({"role": "assistant", "content": ai_response})
\ No newline at end of file
+    st.session_state["message_history"].append({"role": "assistant", "content": ai_response})
+
+    # Per-turn trace: where this turn's time went (LLM, tools, checkpoints)
+    with st.expander("⏱️ Turn trace"):
+        st.dataframe(get_turn_trace(st.session_state["thread_id"]), use_container_width=True)
\ No newline at end of file
@@ -0,0 +1,285 @@
+"""
+Load and latency benchmark for the compiled chatbot graph.
+
+Everything external is replaced by local stand-ins so runs are reproducible
+and cost nothing:
+    * ScriptedChatModel answers each scenario prompt with scripted tool calls,
+      then with a final text answer, after a configurable delay,
+    * a local HTTP server mimics the weather, news, exchange-rate, joke, NASA,
+      IP-location and Alpha Vantage endpoints with a configurable delay.
+The real graph, tools, HTTP client, tool cache and SQLite checkpointer are
+used unchanged. For each concurrency level the harness reports p50/p95/p99
+turn latency, throughput and how much the checkpoint database grew.
+
+    python benchmark.py --concurrency 1,4,16 --turns-per-user 5 --llm-latency-ms 50
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from urllib.parse import urlparse
+import argparse
+import tempfile
+import threading
+import uuid
+import json
+import math
+import time
+import os
+
+# =========================Scenarios======================
+# One entry per benchmark prompt: the tool calls the fake model asks for, then its answer
+SCENARIOS = [
+    {"prompt": "What's the weather in London?", "tool_calls": [("fetch_weather", {"city": "London"})],
+     "answer": "It is 18 degrees and partly cloudy in London."},
+    {"prompt": "Any news about technology?", "tool_calls": [("fetch_news", {"topic": "technology"})],
+     "answer": "Here are the latest technology headlines."},
+    {"prompt": "Convert 100 USD to EUR", "tool_calls": [("convert_currency", {"amount": 100, "from_currency": "USD", "to_currency": "EUR"})],
+     "answer": "100 USD is about 92 EUR."},
+    {"prompt": "Convert 10 USD to GBP and 5000 JPY to PKR",
+     "tool_calls": [("convert_currencies", {"conversions": [
+         {"amount": 10, "from_currency": "USD", "to_currency": "GBP"},
+         {"amount": 5000, "from_currency": "JPY", "to_currency": "PKR"},
+     ]})],
+     "answer": "That is about 7.90 GBP and 9187 PKR."},
+    {"prompt": "What is the AAPL stock price?", "tool_calls": [("get_stock_price", {"symbol": "AAPL"})],
+     "answer": "AAPL last traded at 189.50."},
+    {"prompt": "Show me the astronomy picture of the day", "tool_calls": [("get_nasa_apod", {})],
+     "answer": "Today's picture shows a spiral galaxy."},
+    {"prompt": "Where is 8.8.8.8?", "tool_calls": [("get_ip_location", {"ip": "8.8.8.8"})],
+     "answer": "That address is in Mountain View, United States."},
+    {"prompt": "Weather in Paris and the price of MSFT",
+     "tool_calls": [("fetch_weather", {"city": "Paris"}), ("get_stock_price", {"symbol": "MSFT"})],
+     "answer": "Paris is mild today and MSFT is at 415.10."},
+    {"prompt": "Compare AAPL, MSFT and GOOGL", "tool_calls": [("get_stock_quotes", {"symbols": ["AAPL", "MSFT", "GOOGL"]})],
+     "answer": "AAPL leads, followed by MSFT and GOOGL."},
+    {"prompt": "tell me a joke", "tool_calls": [], "answer": "Hope that made you smile!"},
+]
+
+# =========================Fake Chat Model======================
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model stand-in driven by SCENARIOS. A user prompt gets the scenario's
+    tool calls; a tool result gets the scenario's answer, streamed word by word.
+    """
+
+    latency_ms: float = 50.0
+    token_delay_ms: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-benchmark"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _reply(self, messages) -> AIMessage:
+        prompt = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        scenario = next((s for s in SCENARIOS if s["prompt"] == prompt), None)
+        if scenario is None:
+            return AIMessage(content="I can help with that.")
+        if getattr(messages[-1], "tool_call_id", None) is None and scenario["tool_calls"]:
+            tool_calls = [
+                {"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}
+                for name, args in scenario["tool_calls"]
+            ]
+            return AIMessage(content="", tool_calls=tool_calls)
+        return AIMessage(content=scenario["answer"])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        reply = self._reply(messages)
+        if reply.tool_calls:
+            tool_call_chunks = [
+                {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": i}
+                for i, c in enumerate(reply.tool_calls)
+            ]
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=tool_call_chunks))
+            return
+        for i, word in enumerate(reply.content.split(" ")):
+            if self.token_delay_ms:
+                time.sleep(self.token_delay_ms / 1000)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+# =========================Upstream API Stand-ins======================
+def stand_in_response(path: str):
+    """Canned JSON body for a request path, or None for an unknown path."""
+    if path.startswith("/alphavantage"):
+        return {"Global Quote": {"01. symbol": "AAPL", "05. price": "189.5000", "10. change percent": "0.42%"}}
+    if path.startswith("/weather"):
+        return {"current": {"temp_c": 18.0, "condition": {"text": "Partly cloudy"}, "humidity": 60}}
+    if path.startswith("/news"):
+        return {"articles": [{"title": f"Headline {i}"} for i in range(5)]}
+    if path.startswith("/fx"):
+        return {"rates": {"USD": 1.0, "EUR": 0.92, "GBP": 0.79, "JPY": 151.3, "PKR": 278.0}}
+    if path.startswith("/joke"):
+        return {"joke": "I told my computer a joke about UDP. I'm not sure it got it."}
+    if path.startswith("/apod"):
+        return {"title": "Spiral Galaxy", "explanation": "A spiral galaxy seen face-on. " * 10, "url": "https://example.com/apod.jpg"}
+    if path.startswith("/ipapi"):
+        return {"city": "Mountain View", "country_name": "United States", "latitude": 37.4, "longitude": -122.1}
+    return None
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+    latency_ms = 0.0
+
+    def do_GET(self):
+        body = stand_in_response(urlparse(self.path).path)
+        if body is None:
+            self.send_error(404)
+            return
+        time.sleep(self.latency_ms / 1000)
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stand_ins(latency_ms: float = 20.0, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve the upstream stand-ins on a free port from a daemon thread."""
+    handler = type("StandInHandler", (_StandInHandler,), {"latency_ms": latency_ms})
+    server = ThreadingHTTPServer((host, 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="benchmark-stand-ins").start()
+    return server
+
+def point_tools_at(base_url: str):
+    """Route every tool's upstream URL to the stand-in server (before the backend is imported)."""
+    os.environ.update({
+        "ALPHA_VANTAGE_URL": f"{base_url}/alphavantage/query",
+        "WEATHER_API_URL": f"{base_url}/weather/current.json",
+        "NEWS_API_URL": f"{base_url}/news/everything",
+        "EXCHANGE_RATES_URL": f"{base_url}/fx/latest.json",
+        "JOKE_API_URL": f"{base_url}/joke",
+        "NASA_APOD_URL": f"{base_url}/apod",
+        "IP_LOCATION_URL": f"{base_url}/ipapi",
+    })
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    # The stand-ins have no upstream quota; only throttle quotes when asked to
+    os.environ.setdefault("ALPHA_VANTAGE_RATE_PER_MINUTE", "0")
+
+# =========================Measurement======================
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile of values (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def database_size(database: str) -> int:
+    return sum(os.path.getsize(path) for path in (database, database + "-wal") if os.path.exists(path))
+
+def run_level(chatbot, concurrency: int, turns_per_user: int, database: str) -> dict:
+    """Run `concurrency` simulated users, each sending turns_per_user messages on its own thread."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    run_id = uuid.uuid4().hex[:8]
+
+    def user(index: int):
+        config = {"configurable": {"thread_id": f"bench-{run_id}-{index}"}}
+        for turn in range(turns_per_user):
+            scenario = SCENARIOS[(index + turn) % len(SCENARIOS)]
+            start = time.perf_counter()
+            try:
+                chatbot.invoke({"messages": [HumanMessage(content=scenario["prompt"])]}, config=config)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed_ms)
+
+    bytes_before = database_size(database)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench-user") as pool:
+        list(pool.map(user, range(concurrency)))
+    wall_seconds = time.perf_counter() - started
+    bytes_after = database_size(database)
+    turns = len(latencies)
+    return {
+        "concurrency": concurrency,
+        "turns": turns,
+        "errors": len(errors),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "throughput_tps": round(turns / wall_seconds, 2) if wall_seconds else 0.0,
+        "db_growth_bytes": bytes_after - bytes_before,
+        "db_bytes_per_turn": round((bytes_after - bytes_before) / turns) if turns else 0,
+    }
+
+def run_benchmark(concurrency_levels=(1, 4, 16), turns_per_user: int = 5, llm_latency_ms: float = 50.0,
+                  token_delay_ms: float = 0.0, tool_latency_ms: float = 20.0, database: str = None,
+                  warm_cache: bool = False) -> list:
+    """Sweep the concurrency levels against one fresh checkpoint database and return one report per level."""
+    server = start_stand_ins(tool_latency_ms)
+    point_tools_at(f"http://127.0.0.1:{server.server_address[1]}")
+    # Imported after the endpoints are redirected: the backend reads them at import time
+    import langgraph_tool_backend as backend
+    from checkpoint_store import create_checkpointer
+    from tool_cache import tool_cache
+
+    database = database or os.path.join(tempfile.mkdtemp(prefix="chatbot-bench-"), "bench.db")
+    checkpointer = create_checkpointer(f"sqlite:///{database}")
+    tools = [tool for tool in backend.default_tools() if tool.name != "duckduckgo_search"]
+    llm = ScriptedChatModel(latency_ms=llm_latency_ms, token_delay_ms=token_delay_ms)
+    chatbot = backend.build_chatbot(backend.ChatComponents(llm, tools), checkpointer=checkpointer)
+    reports = []
+    try:
+        for concurrency in concurrency_levels:
+            if not warm_cache:
+                tool_cache.clear()
+            report = run_level(chatbot, concurrency, turns_per_user, database)
+            report["db_bytes_total"] = database_size(database)
+            reports.append(report)
+    finally:
+        checkpointer.close()
+        server.shutdown()
+    return reports
+
+def format_reports(reports: list) -> str:
+    columns = ["concurrency", "turns", "errors", "p50_ms", "p95_ms", "p99_ms",
+               "throughput_tps", "db_growth_bytes", "db_bytes_per_turn", "db_bytes_total"]
+    widths = [max(len(c), *(len(str(r[c])) for r in reports)) for c in columns]
+    lines = ["  ".join(c.rjust(w) for c, w in zip(columns, widths))]
+    for report in reports:
+        lines.append("  ".join(str(report[c]).rjust(w) for c, w in zip(columns, widths)))
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark chat turns against local stand-ins for Groq and the tool APIs.")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrent users per level")
+    parser.add_argument("--turns-per-user", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="delay before the fake model replies")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="delay between streamed tokens")
+    parser.add_argument("--tool-latency-ms", type=float, default=20.0, help="delay of each stand-in API response")
+    parser.add_argument("--database", default=None, help="checkpoint database (default: a temporary file)")
+    parser.add_argument("--warm-cache", action="store_true", help="keep the tool cache between levels")
+    parser.add_argument("--json", action="store_true", help="print the reports as JSON")
+    args = parser.parse_args()
+    reports = run_benchmark(
+        concurrency_levels=[int(c) for c in args.concurrency.split(",") if c.strip()],
+        turns_per_user=args.turns_per_user,
+        llm_latency_ms=args.llm_latency_ms,
+        token_delay_ms=args.token_delay_ms,
+        tool_latency_ms=args.tool_latency_ms,
+        database=args.database,
+        warm_cache=args.warm_cache,
+    )
+    print(json.dumps(reports, indent=2) if args.json else format_reports(reports))
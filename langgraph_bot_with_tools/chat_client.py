@@ -0,0 +1,75 @@
+"""
+Thin client for server.py with the same call signatures as the backend
+functions the Streamlit apps use, so a frontend can switch between running
+the graph in-process and talking to a headless server by changing an import.
+The server address comes from CHATBOT_SERVER_URL.
+"""
+from http_client import get_session, http_get, HTTP_CONNECT_TIMEOUT
+import json
+import os
+
+CHATBOT_SERVER_URL = os.getenv("CHATBOT_SERVER_URL", "http://127.0.0.1:8765").rstrip("/")
+# A turn's stream can pause while tools run; allow longer gaps than ordinary API calls
+CHAT_STREAM_READ_TIMEOUT = float(os.getenv("CHAT_STREAM_READ_TIMEOUT", "120"))
+
+def _thread_id(config: dict) -> str:
+    return str(config["configurable"]["thread_id"])
+
+def _get_json(path: str, params: dict = None):
+    """GET a server endpoint with the shared pool's default timeouts, so a stalled server cannot hang the UI."""
+    response = http_get(f"{CHATBOT_SERVER_URL}{path}", params=params)
+    response.raise_for_status()
+    return response.json()
+
+def stream_turn_events(user_input: str, config: dict):
+    """Run one turn on the server and yield its events (see backend.stream_turn_events)."""
+    body = {"input": user_input, "recursion_limit": config.get("recursion_limit")}
+    with get_session().post(
+        f"{CHATBOT_SERVER_URL}/threads/{_thread_id(config)}/turns",
+        json=body,
+        stream=True,
+        timeout=(HTTP_CONNECT_TIMEOUT, CHAT_STREAM_READ_TIMEOUT),
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+def retrieve_all_threads(limit: int = None, offset: int = 0):
+    """Thread ids known to the server, most recently updated first."""
+    try:
+        params = {"limit": -1 if limit is None else limit, "offset": offset}
+        rows = _get_json("/threads", params)
+        return [row["thread_id"] for row in rows]
+    except Exception as e:
+        print(f"Error retrieving threads: {e}")
+        return []
+
+def load_history_page(thread_id, limit: int = None, end: int = None):
+    """One page of a thread's history from the server: (messages, start)."""
+    params = {}
+    if limit is not None:
+        params["limit"] = limit
+    if end is not None:
+        params["end"] = end
+    try:
+        data = _get_json(f"/threads/{thread_id}/history", params)
+        return data["messages"], data["start"]
+    except Exception as e:
+        print(f"Error loading history: {e}")
+        return [], 0
+
+def search_history(query: str, limit: int = 20):
+    """Ranked full-text matches across conversations (see backend.search_history)."""
+    try:
+        return _get_json("/search", {"q": query, "limit": limit})
+    except Exception as e:
+        print(f"Error searching history: {e}")
+        return []
+
+def get_turn_trace(thread_id) -> list:
+    try:
+        return _get_json(f"/threads/{thread_id}/trace")
+    except Exception as e:
+        print(f"Error loading turn trace: {e}")
+        return []
@@ -0,0 +1,296 @@
+"""
+Checkpoint history compaction for the SQLite checkpoint store.
+
+The graph writes a full checkpoint after every super-step, so each user
+message leaves several snapshots behind. This module applies a retention
+policy to chatbot.db:
+    * keep the latest N checkpoints per thread and/or drop checkpoints older
+      than a maximum age (the newest checkpoint of a thread is always kept),
+    * move threads idle for longer than a cutoff to gzip-compressed archives,
+    * give freed pages back to the filesystem with incremental vacuum,
+and reports how many bytes were reclaimed.
+
+Run it once from the command line:
+    python checkpoint_compaction.py chatbot.db --keep-last 5 --archive-after-days 90
+or in-process with start_compaction_job().
+"""
+from datetime import datetime, timezone
+import argparse
+import threading
+import sqlite3
+import base64
+import uuid
+import gzip
+import json
+import time
+import os
+
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "0")) or None
+CHECKPOINT_MAX_AGE_DAYS = float(os.getenv("CHECKPOINT_MAX_AGE_DAYS", "0")) or None
+CHECKPOINT_ARCHIVE_AFTER_DAYS = float(os.getenv("CHECKPOINT_ARCHIVE_AFTER_DAYS", "0")) or None
+CHECKPOINT_ARCHIVE_DIR = os.getenv("CHECKPOINT_ARCHIVE_DIR", "checkpoint_archive")
+CHECKPOINT_COMPACTION_INTERVAL = float(os.getenv("CHECKPOINT_COMPACTION_INTERVAL", "0"))
+
+# Offset between the UUID epoch (1582-10-15) and the Unix epoch, in 100ns ticks
+_UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+def checkpoint_unix_time(checkpoint_id: str) -> float:
+    """Creation time encoded in a LangGraph (UUIDv6) checkpoint id."""
+    try:
+        value = uuid.UUID(checkpoint_id).int >> 64
+    except (TypeError, ValueError):
+        return 0.0
+    ticks = ((value >> 16) << 12) | (value & 0x0FFF)
+    return (ticks - _UUID_EPOCH_OFFSET) / 1e7
+
+def _connect(database: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(database, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout=30000")
+    conn.create_function("checkpoint_unix_time", 1, checkpoint_unix_time, deterministic=True)
+    return conn
+
+def _files_size(database: str) -> int:
+    return sum(os.path.getsize(path) for path in (database, database + "-wal") if os.path.exists(path))
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+# =========================Retention======================
+def prune_checkpoints(conn: sqlite3.Connection, keep_last: int = None, max_age_days: float = None) -> dict:
+    """
+    Delete checkpoints beyond the newest `keep_last` per thread and/or older
+    than `max_age_days`. A checkpoint is only removed when it fails every
+    configured rule, and the newest checkpoint of each thread always stays.
+    """
+    if not keep_last and not max_age_days:
+        return {"checkpoints_deleted": 0, "writes_deleted": 0}
+    keep_rank = keep_last or 1
+    cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+    conditions = ["rn > ?"]
+    params = [keep_rank]
+    if cutoff is not None:
+        conditions.append("checkpoint_unix_time(checkpoint_id) < ?")
+        params.append(cutoff)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        checkpoints_deleted = conn.execute(
+            f"""
+            DELETE FROM checkpoints WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, checkpoint_id, ROW_NUMBER() OVER (
+                        PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                    ) AS rn
+                    FROM checkpoints
+                )
+                WHERE {" AND ".join(conditions)}
+            )
+            """,
+            params,
+        ).rowcount
+        writes_deleted = conn.execute(
+            """
+            DELETE FROM writes WHERE NOT EXISTS (
+                SELECT 1 FROM checkpoints c
+                WHERE c.thread_id = writes.thread_id
+                  AND c.checkpoint_ns = writes.checkpoint_ns
+                  AND c.checkpoint_id = writes.checkpoint_id
+            )
+            """
+        ).rowcount
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return {"checkpoints_deleted": checkpoints_deleted, "writes_deleted": writes_deleted}
+
+# =========================Cold Thread Archive======================
+def _encode_row(columns, row) -> dict:
+    return {
+        column: {"b64": base64.b64encode(value).decode()} if isinstance(value, bytes) else value
+        for column, value in zip(columns, row)
+    }
+
+def _decode_row(row: dict) -> dict:
+    return {
+        column: base64.b64decode(value["b64"]) if isinstance(value, dict) else value
+        for column, value in row.items()
+    }
+
+def archive_cold_threads(conn: sqlite3.Connection, archive_after_days: float, archive_dir: str = CHECKPOINT_ARCHIVE_DIR) -> list:
+    """
+    Move threads with no checkpoint newer than `archive_after_days` into
+    <archive_dir>/<thread_id>.jsonl.gz and delete them from the database.
+    Returns the archived thread ids.
+    """
+    cutoff = time.time() - archive_after_days * 86400
+    cold = [
+        row[0] for row in conn.execute(
+            """
+            SELECT thread_id FROM checkpoints GROUP BY thread_id
+            HAVING MAX(checkpoint_unix_time(checkpoint_id)) < ?
+            """,
+            (cutoff,),
+        )
+    ]
+    if not cold:
+        return []
+    os.makedirs(archive_dir, exist_ok=True)
+    has_index = _has_table(conn, "thread_index")
+    has_search = _has_table(conn, "message_search_state")
+    for thread_id in cold:
+        path = os.path.join(archive_dir, f"{thread_id}.jsonl.gz")
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for table in ("checkpoints", "writes"):
+                cursor = conn.execute(f"SELECT * FROM {table} WHERE thread_id = ?", (thread_id,))
+                columns = [d[0] for d in cursor.description]
+                for row in cursor:
+                    f.write(json.dumps({"table": table, "row": _encode_row(columns, row)}) + "\n")
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+        conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+        if has_index:
+            conn.execute("DELETE FROM thread_index WHERE thread_id = ?", (thread_id,))
+        if has_search:
+            conn.execute("DELETE FROM message_search WHERE thread_id = ?", (thread_id,))
+            conn.execute("DELETE FROM message_search_state WHERE thread_id = ?", (thread_id,))
+        conn.execute("COMMIT")
+    return cold
+
+def restore_thread(database: str, archive_path: str) -> int:
+    """Load an archived thread back into the database. Returns the rows restored."""
+    conn = _connect(database)
+    restored = 0
+    thread_ids = set()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        with gzip.open(archive_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                row = _decode_row(record["row"])
+                thread_ids.add(row["thread_id"])
+                placeholders = ", ".join("?" for _ in row)
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {record['table']} ({', '.join(row)}) VALUES ({placeholders})",
+                    list(row.values()),
+                )
+                restored += 1
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    for thread_id in thread_ids:
+        reindex_thread(database, thread_id)
+    return restored
+
+def reindex_thread(database: str, thread_id: str):
+    """
+    Re-add a restored thread to the thread index and history search kept in
+    the same database (archiving removed it from both).
+    """
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    from thread_index import ThreadIndex
+    from history_search import HistorySearch
+
+    conn = _connect(database)
+    try:
+        indexes = [index for index, table in ((ThreadIndex, "thread_index"), (HistorySearch, "message_search_state"))
+                   if _has_table(conn, table)]
+        if not indexes:
+            return
+        checkpoint_tuple = SqliteSaver(conn).get_tuple({"configurable": {"thread_id": thread_id}})
+    finally:
+        conn.close()
+    if checkpoint_tuple is None:
+        return
+    for index_class in indexes:
+        index = index_class(database)
+        try:
+            index.record_checkpoint(checkpoint_tuple.config, checkpoint_tuple.checkpoint)
+        finally:
+            index.conn.close()
+
+# =========================Vacuum======================
+def incremental_vacuum(conn: sqlite3.Connection, max_pages: int = None) -> None:
+    """
+    Release free pages to the filesystem. The first run switches the database
+    to auto_vacuum=INCREMENTAL, which needs one full VACUUM.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    elif max_pages:
+        conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+    else:
+        conn.execute("PRAGMA incremental_vacuum").fetchall()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+# =========================Compaction Run======================
+def compact(database: str = "chatbot.db", keep_last: int = CHECKPOINT_KEEP_LAST,
+            max_age_days: float = CHECKPOINT_MAX_AGE_DAYS,
+            archive_after_days: float = CHECKPOINT_ARCHIVE_AFTER_DAYS,
+            archive_dir: str = CHECKPOINT_ARCHIVE_DIR, vacuum_pages: int = None) -> dict:
+    """Apply the retention policy to one database and report what was reclaimed."""
+    bytes_before = _files_size(database)
+    conn = _connect(database)
+    try:
+        if not _has_table(conn, "checkpoints"):
+            return {"database": database, "bytes_before": bytes_before, "bytes_after": bytes_before, "bytes_reclaimed": 0}
+        archived = archive_cold_threads(conn, archive_after_days, archive_dir) if archive_after_days else []
+        report = prune_checkpoints(conn, keep_last=keep_last, max_age_days=max_age_days)
+        try:
+            incremental_vacuum(conn, vacuum_pages)
+        except sqlite3.OperationalError as e:
+            # Another connection holds a transaction; the pages are reused and freed next run
+            print(f"Vacuum skipped: {e}")
+    finally:
+        conn.close()
+    bytes_after = _files_size(database)
+    report.update({
+        "database": database,
+        "threads_archived": len(archived),
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "bytes_reclaimed": max(0, bytes_before - bytes_after),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+    })
+    return report
+
+def start_compaction_job(database: str = "chatbot.db", interval_seconds: float = CHECKPOINT_COMPACTION_INTERVAL, **policy) -> threading.Event:
+    """Run compact() every interval_seconds on a daemon thread. Set the returned event to stop."""
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval_seconds):
+            try:
+                report = compact(database, **policy)
+                print(f"Checkpoint compaction: {json.dumps(report)}")
+            except Exception as e:
+                print(f"Error in checkpoint compaction: {e}")
+
+    threading.Thread(target=loop, daemon=True, name="checkpoint-compaction").start()
+    return stop
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact the chatbot checkpoint database.")
+    parser.add_argument("database", nargs="?", default="chatbot.db")
+    parser.add_argument("--keep-last", type=int, default=CHECKPOINT_KEEP_LAST, help="checkpoints to keep per thread")
+    parser.add_argument("--max-age-days", type=float, default=CHECKPOINT_MAX_AGE_DAYS, help="drop checkpoints older than this")
+    parser.add_argument("--archive-after-days", type=float, default=CHECKPOINT_ARCHIVE_AFTER_DAYS, help="archive threads idle this long")
+    parser.add_argument("--archive-dir", default=CHECKPOINT_ARCHIVE_DIR)
+    parser.add_argument("--vacuum-pages", type=int, default=None, help="limit pages freed per run")
+    parser.add_argument("--restore", metavar="ARCHIVE", help="restore an archived thread instead of compacting")
+    args = parser.parse_args()
+    if args.restore:
+        print(f"Restored {restore_thread(args.database, args.restore)} rows")
+    else:
+        print(json.dumps(compact(
+            args.database,
+            keep_last=args.keep_last,
+            max_age_days=args.max_age_days,
+            archive_after_days=args.archive_after_days,
+            archive_dir=args.archive_dir,
+            vacuum_pages=args.vacuum_pages,
+        ), indent=2))
@@ -0,0 +1,363 @@
+"""
+Pluggable checkpoint storage for the chat graph.
+
+The backend is chosen by CHECKPOINT_URL, so the same graph can run on:
+    memory://                        in-process InMemorySaver (tests, demos)
+    sqlite:///chatbot.db             PooledSqliteSaver (default)
+    postgresql://user:pw@host/db     PostgresSaver on a psycopg connection pool
+
+PooledSqliteSaver replaces the single shared connection with per-thread WAL
+read connections and one group-commit writer, so Streamlit sessions no longer
+serialize on each other's checkpoint reads and concurrent writes share commits.
+"""
+from langgraph.checkpoint.sqlite import SqliteSaver
+from concurrent.futures import Future
+from contextlib import contextmanager
+from instrumentation import timed, thread_id_from_config
+import contextvars
+import threading
+import asyncio
+import sqlite3
+import queue
+import os
+
+CHECKPOINT_URL = os.getenv("CHECKPOINT_URL", "sqlite:///chatbot.db")
+CHECKPOINT_BATCH_SIZE = int(os.getenv("CHECKPOINT_BATCH_SIZE", "64"))
+CHECKPOINT_POOL_SIZE = int(os.getenv("CHECKPOINT_POOL_SIZE", "10"))
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=30000",
+)
+# Set while aput runs, so a saver whose aput delegates to put notifies listeners once
+_in_async_put = contextvars.ContextVar("in_async_put", default=False)
+
+def connect_sqlite(database: str) -> sqlite3.Connection:
+    """Open an autocommit connection tuned for concurrent readers and short writes."""
+    conn = sqlite3.connect(database, check_same_thread=False, timeout=30, isolation_level=None)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def execute_statements(conn: sqlite3.Connection, statements: list):
+    """Run (many, sql, parameters) statements as recorded for the group-commit writer."""
+    for many, sql, parameters in statements:
+        if many:
+            conn.executemany(sql, parameters)
+        else:
+            conn.execute(sql, parameters)
+
+# =========================Write Hooks======================
+class CheckpointHooksMixin:
+    """
+    Calls registered listeners after every successful checkpoint write, so
+    side indexes (thread catalog, search) stay current without re-scanning the
+    checkpoint table. Listener errors are logged, never raised. Async puts run
+    the listeners on a worker thread so their SQLite writes never block the
+    event loop. Reads and writes are also timed under the "checkpoint"
+    instrumentation kind.
+    """
+
+    def add_put_listener(self, listener):
+        """Register listener(config, checkpoint, metadata), called after each put."""
+        if "_put_listeners" not in self.__dict__:
+            self._put_listeners = []
+        self._put_listeners.append(listener)
+
+    def _notify_put(self, config, checkpoint, metadata):
+        for listener in self.__dict__.get("_put_listeners", ()):
+            try:
+                listener(config, checkpoint, metadata)
+            except Exception as e:
+                print(f"Error in checkpoint listener: {e}")
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with timed("checkpoint", "put", thread_id_from_config(config)):
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+        if not _in_async_put.get():
+            self._notify_put(next_config, checkpoint, metadata)
+        return next_config
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        token = _in_async_put.set(True)
+        try:
+            with timed("checkpoint", "put", thread_id_from_config(config)):
+                next_config = await super().aput(config, checkpoint, metadata, new_versions)
+        finally:
+            _in_async_put.reset(token)
+        await asyncio.to_thread(self._notify_put, next_config, checkpoint, metadata)
+        return next_config
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with timed("checkpoint", "put_writes", thread_id_from_config(config)):
+            return super().put_writes(config, writes, task_id, task_path)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        with timed("checkpoint", "put_writes", thread_id_from_config(config)):
+            return await super().aput_writes(config, writes, task_id, task_path)
+
+    def get_tuple(self, config):
+        with timed("checkpoint", "get_tuple", thread_id_from_config(config)):
+            return super().get_tuple(config)
+
+    async def aget_tuple(self, config):
+        with timed("checkpoint", "get_tuple", thread_id_from_config(config)):
+            return await super().aget_tuple(config)
+
+_hooked_classes = {}
+
+def with_hooks(saver_class):
+    """Return a subclass of saver_class that supports add_put_listener()."""
+    if issubclass(saver_class, CheckpointHooksMixin):
+        return saver_class
+    if saver_class not in _hooked_classes:
+        _hooked_classes[saver_class] = type(f"Hooked{saver_class.__name__}", (CheckpointHooksMixin, saver_class), {})
+    return _hooked_classes[saver_class]
+
+# =========================Pooled SQLite Saver======================
+class _RecordingCursor:
+    """Collects the statements of one write transaction for the writer thread."""
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, sql, parameters=()):
+        self.statements.append((False, sql, parameters))
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self.statements.append((True, sql, list(seq_of_parameters)))
+        return self
+
+class GroupCommitWriter:
+    """
+    Single writer thread that applies queued write transactions.
+    Everything queued while the previous commit was running is applied in one
+    SQLite transaction (up to batch_size), so concurrent sessions share one WAL
+    sync instead of each paying for their own. Every transaction runs inside a
+    savepoint, so one failing write does not roll back its batch neighbours.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, batch_size: int = CHECKPOINT_BATCH_SIZE):
+        self.conn = conn
+        self.batch_size = max(1, batch_size)
+        self.jobs = queue.Queue()
+        self.batches = 0
+        self.transactions = 0
+        self.thread = threading.Thread(target=self._run, daemon=True, name="checkpoint-writer")
+        self.thread.start()
+
+    def submit(self, statements: list) -> Future:
+        return self.submit_group([statements])[0]
+
+    def submit_group(self, transactions: list) -> list:
+        """Queue several transactions as one unit, so they commit in the same batch (each in its own savepoint)."""
+        group = [(statements, Future()) for statements in transactions]
+        self.jobs.put(group)
+        return [future for _, future in group]
+
+    def _run(self):
+        while True:
+            group = self.jobs.get()
+            if group is None:
+                return
+            batch = list(group)
+            while len(batch) < self.batch_size:
+                try:
+                    group = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if group is None:
+                    self.jobs.put(None)
+                    break
+                batch.extend(group)
+            self._apply(batch)
+
+    def _apply(self, batch: list):
+        results = []
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            for statements, future in batch:
+                self.conn.execute("SAVEPOINT job")
+                try:
+                    execute_statements(self.conn, statements)
+                    self.conn.execute("RELEASE job")
+                    results.append((future, None))
+                except Exception as e:
+                    self.conn.execute("ROLLBACK TO job")
+                    self.conn.execute("RELEASE job")
+                    results.append((future, e))
+            self.conn.execute("COMMIT")
+        except Exception as e:
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK")
+            results = [(future, e) for _, future in batch]
+        self.batches += 1
+        self.transactions += len(batch)
+        for future, error in results:
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+    def close(self):
+        self.jobs.put(None)
+        self.thread.join()
+
+class PooledSqliteSaver(CheckpointHooksMixin, SqliteSaver):
+    """
+    SqliteSaver with per-thread read connections and a group-commit writer.
+    Side indexes stored in the same database register their statements with
+    add_put_statements(), so they commit in the checkpoint's batch instead of
+    on a connection of their own. The write connection belongs to the writer
+    thread; `conn` is the calling thread's read connection, so SqliteSaver
+    code that reads through self.conn (list()) never shares a connection with
+    a batch that is still open.
+    """
+
+    def __init__(self, database: str, *, batch_size: int = CHECKPOINT_BATCH_SIZE, serde=None):
+        self.database = database
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        super().__init__(connect_sqlite(database), serde=serde)
+        self.setup()
+        self.writer = GroupCommitWriter(self._write_conn, batch_size=batch_size)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return self._reader()
+
+    @conn.setter
+    def conn(self, conn: sqlite3.Connection):
+        # Set by SqliteSaver.__init__; handed to the writer thread
+        self._write_conn = conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect_sqlite(self.database)
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def add_put_statements(self, builder):
+        """
+        Register builder(config, checkpoint, metadata) -> statements, written
+        with each checkpoint in the same commit batch. They run in their own
+        savepoint, so a failing index write never loses the checkpoint.
+        """
+        if "_put_statement_builders" not in self.__dict__:
+            self._put_statement_builders = []
+        self._put_statement_builders.append(builder)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        statements = []
+        for builder in self.__dict__.get("_put_statement_builders", ()):
+            try:
+                statements.extend(builder(config, checkpoint, metadata))
+            except Exception as e:
+                print(f"Error in checkpoint statement builder: {e}")
+        self._local.put_statements = statements
+        try:
+            return super().put(config, checkpoint, metadata, new_versions)
+        finally:
+            self._local.put_statements = None
+
+    @contextmanager
+    def cursor(self, transaction: bool = True):
+        if transaction:
+            recorder = _RecordingCursor()
+            yield recorder
+            if not recorder.statements:
+                return
+            index_statements = getattr(self._local, "put_statements", None)
+            self._local.put_statements = None
+            if not index_statements:
+                self.writer.submit(recorder.statements).result()
+                return
+            written, indexed = self.writer.submit_group([recorder.statements, index_statements])
+            written.result()
+            try:
+                indexed.result()
+            except Exception as e:
+                print(f"Error writing checkpoint index statements: {e}")
+            return
+        cur = self._reader().cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+    def close(self):
+        self.writer.close()
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+        self._write_conn.close()
+
+# =========================Side Indexes======================
+# Shared plumbing of the indexes kept next to the checkpoints (thread_index,
+# history_search). An index provides `database`, count(), backfill(),
+# checkpoint_statements() and record_checkpoint().
+def is_subgraph_checkpoint(config) -> bool:
+    """Subgraph checkpoints belong to their parent thread, so side indexes skip them."""
+    return bool(config["configurable"].get("checkpoint_ns"))
+
+def latest_checkpoints(checkpointer) -> list:
+    """The newest top-level checkpoint tuple of every thread, for backfilling an index."""
+    latest = {}
+    for checkpoint_tuple in checkpointer.list(None):
+        thread_id = checkpoint_tuple.config["configurable"]["thread_id"]
+        if thread_id not in latest and not is_subgraph_checkpoint(checkpoint_tuple.config):
+            latest[thread_id] = checkpoint_tuple
+    return list(latest.values())
+
+def shares_write_batch(checkpointer, database: str) -> bool:
+    """True when an index stored in `database` can commit with the checkpointer's own writes."""
+    saver_database = getattr(checkpointer, "database", None)
+    return (
+        hasattr(checkpointer, "add_put_statements") and saver_database is not None
+        and os.path.realpath(saver_database) == os.path.realpath(database)
+    )
+
+def attach_index(index, checkpointer):
+    """
+    Keep a side index current with the checkpointer's writes, backfilling it
+    first when empty. Its statements commit in the checkpoint's write batch
+    when both share a database, otherwise it is updated from the write hook.
+    """
+    if index.count() == 0:
+        index.backfill(checkpointer)
+    if shares_write_batch(checkpointer, index.database):
+        checkpointer.add_put_statements(index.checkpoint_statements)
+    else:
+        checkpointer.add_put_listener(index.record_checkpoint)
+    return index
+
+# =========================Backend Factory======================
+def create_checkpointer(url: str = CHECKPOINT_URL):
+    """Build the checkpointer named by a storage URL (see module docstring)."""
+    if url.startswith("memory:"):
+        from langgraph.checkpoint.memory import InMemorySaver
+        return with_hooks(InMemorySaver)()
+    if url.startswith("sqlite:///"):
+        return PooledSqliteSaver(url[len("sqlite:///"):])
+    if url.startswith(("postgres://", "postgresql://")):
+        from langgraph.checkpoint.postgres import PostgresSaver
+        from psycopg_pool import ConnectionPool
+
+        pool = ConnectionPool(
+            url,
+            max_size=CHECKPOINT_POOL_SIZE,
+            kwargs={"autocommit": True, "prepare_threshold": 0},
+        )
+        saver = with_hooks(PostgresSaver)(pool)
+        saver.setup()
+        return saver
+    raise ValueError(f"Unsupported checkpoint URL: {url}")
@@ -0,0 +1,100 @@
+"""
+Token-budgeted prompt window for the chat model.
+
+The checkpoint keeps the full message history; only the prompt sent to the LLM
+is bounded. Older turns are condensed into a rolling summary, tool outputs from
+previous turns are cut down, and if the prompt is still over budget the oldest
+whole turns are dropped.
+"""
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+import os
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+SUMMARY_TRIGGER_TOKENS = int(os.getenv("SUMMARY_TRIGGER_TOKENS", str(CONTEXT_TOKEN_BUDGET)))
+SUMMARY_KEEP_TURNS = int(os.getenv("SUMMARY_KEEP_TURNS", "3"))
+OLD_TOOL_OUTPUT_CHARS = int(os.getenv("OLD_TOOL_OUTPUT_CHARS", "300"))
+
+SUMMARY_INSTRUCTIONS = (
+    "Condense the conversation below into a short summary for the assistant's memory. "
+    "Keep names, numbers, user preferences, decisions and open questions. "
+    "Extend the existing summary if there is one. Reply with the summary only."
+)
+
+def count_tokens(messages) -> int:
+    """Approximate prompt tokens for a list of messages."""
+    return count_tokens_approximately(messages)
+
+def is_tool_result(message) -> bool:
+    return getattr(message, "tool_call_id", None) is not None
+
+def turn_starts(messages) -> list:
+    """Indexes of the HumanMessages that open each turn."""
+    return [i for i, message in enumerate(messages) if isinstance(message, HumanMessage)]
+
+def trim_tool_outputs(messages, before: int, max_chars: int = OLD_TOOL_OUTPUT_CHARS) -> list:
+    """Copy of messages where tool outputs before index `before` are truncated."""
+    trimmed = []
+    for i, message in enumerate(messages):
+        if is_tool_result(message) and not isinstance(message, ToolMessage):
+            # Results checkpointed before tool outputs were stored as ToolMessages
+            message = ToolMessage(content=message.content, tool_call_id=message.tool_call_id)
+        content = message.content
+        if i < before and is_tool_result(message) and isinstance(content, str) and len(content) > max_chars:
+            message = message.model_copy(update={"content": content[:max_chars] + " …[trimmed]"})
+        trimmed.append(message)
+    return trimmed
+
+def build_prompt(state, budget: int = CONTEXT_TOKEN_BUDGET) -> list:
+    """
+    Messages to send to the LLM for this step: the rolling summary, then the
+    unsummarized history with old tool outputs trimmed, dropping the oldest
+    turns while over budget. The current turn is always kept whole.
+    """
+    messages = state["messages"][state.get("summarized_count", 0):]
+    starts = turn_starts(messages)
+    current_turn = starts[-1] if starts else 0
+    messages = trim_tool_outputs(messages, before=current_turn)
+    prefix = []
+    if state.get("summary"):
+        prefix = [SystemMessage(content=f"Summary of the earlier conversation: {state['summary']}")]
+    for start in [0] + [s for s in starts if s > 0]:
+        window = prefix + messages[start:]
+        if start >= current_turn or count_tokens(window) <= budget:
+            return window
+    return prefix + messages[current_turn:]
+
+def render_transcript(messages) -> str:
+    lines = []
+    for message in messages:
+        role = "User" if isinstance(message, HumanMessage) else "Tool" if is_tool_result(message) else "Assistant"
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        if not content.strip():
+            continue
+        if role == "Tool":
+            content = content[:OLD_TOOL_OUTPUT_CHARS]
+        lines.append(f"{role}: {content}")
+    return "\n".join(lines)
+
+def summary_cutoff(state, trigger: int = SUMMARY_TRIGGER_TOKENS, keep_turns: int = SUMMARY_KEEP_TURNS):
+    """
+    Index up to which messages should be folded into the summary, or None when
+    the unsummarized history is still under the trigger size.
+    """
+    start = state.get("summarized_count", 0)
+    messages = state["messages"][start:]
+    if count_tokens(messages) <= trigger:
+        return None
+    starts = turn_starts(messages)
+    if len(starts) <= keep_turns:
+        return None
+    return start + starts[-keep_turns]
+
+def summary_request(state, cutoff: int) -> list:
+    """Prompt asking the model to fold messages[summarized_count:cutoff] into the summary."""
+    transcript = render_transcript(state["messages"][state.get("summarized_count", 0):cutoff])
+    existing = state.get("summary") or "(none)"
+    return [
+        SystemMessage(content=SUMMARY_INSTRUCTIONS),
+        HumanMessage(content=f"Existing summary:\n{existing}\n\nConversation:\n{transcript}"),
+    ]
@@ -0,0 +1,175 @@
+"""
+Exchange-rate table and vectorized currency conversion.
+
+The openexchangerates table is held as one float64 array of units per USD,
+addressed by a currency-code -> index map, so a conversion is two array
+lookups and a multiply, and many conversions are a single vectorized
+expression. The table is downloaded on first use, refreshed in the
+background once it is older than FX_REFRESH_SECONDS (callers keep using the
+previous table meanwhile) and, when FX_RATES_PATH is set, saved to disk so a
+restart can serve conversions before the network is reachable.
+"""
+from http_client import http_get
+import numpy as np
+import threading
+import json
+import time
+import os
+
+EXCHANGE_RATES_URL = os.getenv("EXCHANGE_RATES_URL", "https://openexchangerates.org/api/latest.json")
+FX_REFRESH_SECONDS = float(os.getenv("FX_REFRESH_SECONDS", os.getenv("EXCHANGE_RATES_CACHE_TTL", "3600")))
+FX_RATES_PATH = os.getenv("FX_RATES_PATH")
+FX_MAX_CONVERSIONS = int(os.getenv("FX_MAX_CONVERSIONS", "100"))
+
+class UnknownCurrencyError(ValueError):
+    """One or more currency codes are not in the rate table."""
+
+    def __init__(self, codes):
+        self.codes = list(codes)
+        super().__init__(f"Unknown currency code(s): {', '.join(self.codes)}")
+
+class RateTable:
+    """Immutable snapshot: codes, their index and the units-per-USD array."""
+
+    def __init__(self, rates: dict, fetched_at: float):
+        self.codes = sorted(rates)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.rates = np.array([rates[code] for code in self.codes], dtype=np.float64)
+        self.fetched_at = fetched_at
+
+    def __len__(self):
+        return len(self.codes)
+
+    def as_dict(self) -> dict:
+        return dict(zip(self.codes, self.rates.tolist()))
+
+class FxEngine:
+    """Owns the current RateTable and keeps it fresh."""
+
+    def __init__(self, url: str = EXCHANGE_RATES_URL, refresh_seconds: float = FX_REFRESH_SECONDS, snapshot_path: str = FX_RATES_PATH):
+        self.url = url
+        self.refresh_seconds = refresh_seconds
+        self.snapshot_path = snapshot_path
+        self.table = None
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()  # held only while the first table downloads
+        self.refreshing = False
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.conversions = 0
+        self._load_snapshot()
+
+    # =========================Rate Table======================
+    def _load_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path) as f:
+                data = json.load(f)
+            self.table = RateTable(data["rates"], data["fetched_at"])
+        except Exception as e:
+            print(f"Error loading FX snapshot: {e}")
+
+    def _save_snapshot(self, table: RateTable):
+        if not self.snapshot_path:
+            return
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"fetched_at": table.fetched_at, "rates": table.as_dict()}, f)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def refresh(self) -> RateTable:
+        """Download a new table and swap it in. Raises on failure; the old table stays."""
+        try:
+            r = http_get(self.url, params={"app_id": os.getenv("EXCHANGE_API_KEY")})
+            data = json.loads(r.text)
+            if "rates" not in data:
+                raise RuntimeError(data.get("description") or "Exchange rate download failed.")
+            table = RateTable(data["rates"], time.time())
+        except Exception:
+            with self.lock:
+                self.refresh_errors += 1
+            raise
+        with self.lock:
+            self.table = table
+            self.refreshes += 1
+        try:
+            self._save_snapshot(table)
+        except Exception as e:
+            print(f"Error saving FX snapshot: {e}")
+        return table
+
+    def _refresh_in_background(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing FX rates: {e}")
+            finally:
+                with self.lock:
+                    self.refreshing = False
+
+        threading.Thread(target=run, daemon=True, name="fx-refresh").start()
+
+    def current_table(self) -> RateTable:
+        """The table to convert with: blocks only when there is none yet, otherwise refreshes stale tables in the background."""
+        table = self.table
+        if table is None:
+            # First load: one caller downloads, concurrent callers wait for its table
+            with self.load_lock:
+                table = self.table
+                if table is None:
+                    return self.refresh()
+        if time.time() - table.fetched_at > self.refresh_seconds:
+            self._refresh_in_background()
+        return table
+
+    # =========================Conversion======================
+    def validate(self, *code_lists, table: RateTable = None) -> list:
+        """Normalized codes for each list. Raises UnknownCurrencyError naming every unknown code."""
+        table = table or self.current_table()
+        normalized = [[str(code).strip().upper() for code in codes] for codes in code_lists]
+        unknown = sorted({code for codes in normalized for code in codes if code not in table.index})
+        if unknown:
+            raise UnknownCurrencyError(unknown)
+        return normalized
+
+    def convert_many(self, amounts, from_currencies, to_currencies) -> np.ndarray:
+        """
+        Convert amounts[i] from from_currencies[i] to to_currencies[i] in one
+        vectorized step. A single currency code is broadcast to every amount.
+        """
+        table = self.current_table()
+        amounts = np.asarray(amounts, dtype=np.float64).reshape(-1)
+        if isinstance(from_currencies, str):
+            from_currencies = [from_currencies]
+        if isinstance(to_currencies, str):
+            to_currencies = [to_currencies]
+        from_codes, to_codes = self.validate(from_currencies, to_currencies, table=table)
+        from_index = np.array([table.index[code] for code in from_codes], dtype=np.intp)
+        to_index = np.array([table.index[code] for code in to_codes], dtype=np.intp)
+        result = amounts * (table.rates[to_index] / table.rates[from_index])
+        with self.lock:
+            self.conversions += result.size
+        return result
+
+    def convert(self, amount: float, from_currency: str, to_currency: str) -> float:
+        return float(self.convert_many([amount], from_currency, to_currency)[0])
+
+    def stats(self) -> dict:
+        table = self.table
+        with self.lock:
+            return {
+                "currencies": len(table) if table else 0,
+                "table_age_seconds": time.time() - table.fetched_at if table else 0.0,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "conversions": self.conversions,
+            }
+
+fx_engine = FxEngine()
@@ -0,0 +1,208 @@
+"""
+Full-text search over stored conversations.
+
+User and assistant messages are indexed in an SQLite FTS5 table kept next to
+the checkpoints (same database as the thread index). The index is updated
+with every checkpoint write: a small bookkeeping table remembers how many
+messages of each thread are already indexed, so a checkpoint write only
+inserts the messages added since the last one. Like the thread index, the
+inserts commit in the PooledSqliteSaver's write batch when both share a
+database. Tool output and empty messages are not indexed.
+
+Queries run against the FTS index rather than the stored checkpoints, so
+they stay in the millisecond range on large histories:
+    * the last word also matches as a prefix, so the sidebar can search
+      while typing. Longer words use their first PREFIX_LENGTH characters,
+      which the prefix index answers without merging every matching term.
+      FTS query syntax is not exposed,
+    * bm25 ranking is applied to the newest HISTORY_SEARCH_CANDIDATES
+      matches, which bounds the cost of very common words,
+    * highlighted snippets are built only for the hits that are returned.
+"""
+from langchain_core.messages import AIMessage, HumanMessage
+from checkpoint_store import attach_index, connect_sqlite, execute_statements, is_subgraph_checkpoint, latest_checkpoints
+from thread_index import default_index_database
+import threading
+import re
+import os
+
+HISTORY_SEARCH_DB = os.getenv("HISTORY_SEARCH_DB") or default_index_database()
+HISTORY_SEARCH_CANDIDATES = int(os.getenv("HISTORY_SEARCH_CANDIDATES", "2000"))
+SNIPPET_TOKENS = 12
+PREFIX_LENGTH = 4  # longest prefix in the table's prefix index
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+def search_query(text: str) -> str:
+    """An FTS5 MATCH expression for free text: every word required, the last one also as a prefix."""
+    words = _WORD.findall(text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words[:-1]]
+    last = words[-1]
+    if len(last) <= PREFIX_LENGTH:
+        terms.append(f'"{last}"*')
+    else:
+        terms.append(f'("{last}" OR "{last[:PREFIX_LENGTH]}"*)')
+    return " AND ".join(terms)
+
+def searchable_role(message) -> str:
+    if not isinstance(message.content, str) or not message.content.strip():
+        return None
+    if isinstance(message, HumanMessage):
+        return "user"
+    if isinstance(message, AIMessage):
+        return "assistant"
+    return None
+
+class HistorySearch:
+    """FTS5 index of conversation messages, updated incrementally from checkpoint writes."""
+
+    def __init__(self, database: str = HISTORY_SEARCH_DB):
+        self.database = database
+        self.conn = connect_sqlite(database)
+        self.lock = threading.Lock()
+        self.conn.executescript(
+            f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS message_search USING fts5(
+                content,
+                thread_id UNINDEXED,
+                position UNINDEXED,
+                role UNINDEXED,
+                tokenize = 'porter unicode61 remove_diacritics 2',
+                prefix = '2 3 {PREFIX_LENGTH}'
+            );
+            CREATE TABLE IF NOT EXISTS message_search_state (
+                thread_id TEXT PRIMARY KEY,
+                indexed_count INTEGER NOT NULL
+            );
+            """
+        )
+
+    def checkpoint_statements(self, config, checkpoint, metadata=None) -> list:
+        """
+        Statements indexing the messages added since the thread's last
+        checkpoint, as (many, sql, parameters). Turns of one thread run one at
+        a time, so the indexed count read here is the one they will update.
+        """
+        if is_subgraph_checkpoint(config):
+            return []
+        messages = checkpoint.get("channel_values", {}).get("messages")
+        if messages is None:
+            return []
+        thread_id = str(config["configurable"]["thread_id"])
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT indexed_count FROM message_search_state WHERE thread_id = ?", (thread_id,)
+            ).fetchone()
+        indexed = row[0] if row else 0
+        if indexed == len(messages):
+            return []
+        statements = []
+        if indexed > len(messages):
+            # Messages were removed (e.g. RemoveMessage): rebuild this thread's rows
+            statements.append((False, "DELETE FROM message_search WHERE thread_id = ?", (thread_id,)))
+            indexed = 0
+        rows = []
+        for position in range(indexed, len(messages)):
+            role = searchable_role(messages[position])
+            if role is not None:
+                rows.append((messages[position].content, thread_id, position, role))
+        if rows:
+            statements.append(
+                (True, "INSERT INTO message_search (content, thread_id, position, role) VALUES (?, ?, ?, ?)", rows)
+            )
+        statements.append((
+            False,
+            """
+            INSERT INTO message_search_state (thread_id, indexed_count) VALUES (?, ?)
+            ON CONFLICT(thread_id) DO UPDATE SET indexed_count = excluded.indexed_count
+            """,
+            (thread_id, len(messages)),
+        ))
+        return statements
+
+    def record_checkpoint(self, config, checkpoint, metadata=None):
+        """Checkpoint write hook: index the messages added since the thread's last checkpoint."""
+        statements = self.checkpoint_statements(config, checkpoint, metadata)
+        if not statements:
+            return
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                execute_statements(self.conn, statements)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def search(self, text: str, limit: int = 20, thread_id: str = None, one_per_thread: bool = True) -> list:
+        """
+        Best matches for text, most relevant first, as dicts with thread_id,
+        position (index in the thread's stored messages), role, snippet and
+        rank. With one_per_thread only each thread's best hit is returned.
+        """
+        query = search_query(text)
+        if query is None:
+            return []
+        where = "message_search MATCH ?"
+        params = [query]
+        if thread_id is not None:
+            where += " AND thread_id = ?"
+            params.append(str(thread_id))
+        candidates = f"""
+            SELECT rowid AS id, thread_id, position, role, bm25(message_search) AS rank
+            FROM message_search WHERE {where} ORDER BY rowid DESC LIMIT ?
+        """
+        if one_per_thread:
+            sql = f"""
+                SELECT id, thread_id, position, role, rank FROM (
+                    SELECT *, ROW_NUMBER() OVER (PARTITION BY thread_id ORDER BY rank) AS thread_rank
+                    FROM ({candidates})
+                ) WHERE thread_rank = 1 ORDER BY rank LIMIT ?
+            """
+        else:
+            sql = f"SELECT * FROM ({candidates}) ORDER BY rank LIMIT ?"
+        params += [HISTORY_SEARCH_CANDIDATES, limit]
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+            # One rowid lookup per hit; an IN list would make FTS5 walk every match
+            snippets = [
+                self.conn.execute(
+                    f"""
+                    SELECT snippet(message_search, 0, '**', '**', '…', {SNIPPET_TOKENS})
+                    FROM message_search WHERE message_search MATCH ? AND rowid = ?
+                    """,
+                    (query, row[0]),
+                ).fetchone()[0]
+                for row in rows
+            ]
+        return [
+            {"thread_id": thread, "position": position, "role": role, "snippet": snippet, "rank": rank}
+            for (_, thread, position, role, rank), snippet in zip(rows, snippets)
+        ]
+
+    def count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM message_search_state").fetchone()[0]
+
+    def remove(self, thread_id: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM message_search WHERE thread_id = ?", (str(thread_id),))
+            self.conn.execute("DELETE FROM message_search_state WHERE thread_id = ?", (str(thread_id),))
+
+    def optimize(self):
+        """Merge the index's segments; worth running after a large backfill."""
+        with self.lock:
+            self.conn.execute("INSERT INTO message_search (message_search) VALUES ('optimize')")
+
+    def backfill(self, checkpointer):
+        """One-time import of conversations written before the index existed."""
+        latest = latest_checkpoints(checkpointer)
+        for checkpoint_tuple in latest:
+            self.record_checkpoint(checkpoint_tuple.config, checkpoint_tuple.checkpoint)
+        if latest:
+            self.optimize()
+
+    def attach(self, checkpointer):
+        """Keep this index current with the checkpointer's writes."""
+        return attach_index(self, checkpointer)
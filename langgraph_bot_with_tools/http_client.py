@@ -0,0 +1,159 @@
+"""
+Shared pooled HTTP client for the API tools.
+
+Every tool goes through one `requests.Session` so TCP/TLS connections are kept
+alive and reused, each host gets a bounded connection pool, every request has a
+connect/read timeout and idempotent calls are retried with exponential backoff.
+Pool-level counters (reuse rate, pool wait time, retries) are returned by
+`get_pool_stats()`, which the backend registers with the instrumentation
+registry, so they are served as `http_pool_*` gauges on its metrics endpoint.
+"""
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+from instrumentation import record_retries
+import requests
+import threading
+import time
+import os
+
+# =========================Settings======================
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "20"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.3"))
+
+# =========================Pool Counters======================
+class PoolStats:
+    """Thread-safe counters describing how the shared pool is used."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.retries = 0
+        self.errors = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_request(self, retries: int = 0):
+        with self.lock:
+            self.requests += 1
+            self.retries += retries
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def record_new_connection(self):
+        with self.lock:
+            self.new_connections += 1
+
+    def record_wait(self, seconds: float):
+        with self.lock:
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            attempts = self.requests + self.retries
+            reused = max(0, attempts - self.new_connections)
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": reused,
+                "reuse_rate": reused / attempts if attempts else 0.0,
+                "retries": self.retries,
+                "errors": self.errors,
+                "pool_wait_seconds_total": self.wait_seconds,
+                "pool_wait_seconds_max": self.max_wait_seconds,
+            }
+
+pool_stats = PoolStats()
+
+# =========================Instrumented Pools======================
+class _CountingPoolMixin:
+    """Counts fresh connections and time spent waiting for a free pool slot."""
+
+    def _new_conn(self):
+        pool_stats.record_new_connection()
+        return super()._new_conn()
+
+    def _get_conn(self, timeout=None):
+        start = time.perf_counter()
+        try:
+            return super()._get_conn(timeout=HTTP_POOL_TIMEOUT if timeout is None else timeout)
+        finally:
+            pool_stats.record_wait(time.perf_counter() - start)
+
+class CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+class CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose per-host pools report into `pool_stats`."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
+
+# =========================Session======================
+_session = None
+_session_lock = threading.Lock()
+
+def build_session() -> requests.Session:
+    """Create a session with keep-alive pools, bounded per-host size and retries."""
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = PooledHTTPAdapter(
+        pool_connections=HTTP_POOL_HOSTS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        pool_block=True,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"User-Agent": "langgraph-tool-bot/1.0"})
+    return session
+
+def get_session() -> requests.Session:
+    """Return the process-wide shared session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+def http_get(url: str, params: dict = None, timeout=None, **kwargs) -> requests.Response:
+    """GET through the shared pool with the default connect/read timeouts."""
+    if timeout is None:
+        timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    try:
+        response = get_session().get(url, params=params, timeout=timeout, **kwargs)
+    except Exception:
+        pool_stats.record_error()
+        raise
+    retries = getattr(getattr(response.raw, "retries", None), "history", ())
+    pool_stats.record_request(retries=len(retries))
+    record_retries(len(retries))
+    return response
+
+# =========================Metrics======================
+def get_pool_stats() -> dict:
+    return pool_stats.snapshot()
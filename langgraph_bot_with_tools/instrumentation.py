@@ -0,0 +1,238 @@
+"""
+Latency, error and payload instrumentation for chat turns.
+
+Wrap work in `timed(kind, name)` to record a latency histogram, an error
+counter and a span in the current thread's turn trace. Kinds used by the
+backend are "llm", "tool" and "checkpoint". Metrics are rendered in the
+Prometheus text format by `render_metrics()` and served by
+`start_metrics_server()`; `get_turn_trace(thread_id)` returns the spans of
+the latest turn for display in the Streamlit UIs.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import OrderedDict
+import threading
+import json
+import time
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+PAYLOAD_BUCKETS_BYTES = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+MAX_TRACED_THREADS = 256
+
+current_thread_id = ContextVar("current_thread_id", default=None)
+current_tool = ContextVar("current_tool", default=None)
+
+# =========================Metric Types======================
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+class MetricsRegistry:
+    """Counters and histograms keyed by metric name and label set."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+
+    def inc(self, metric: str, amount: float = 1, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, metric: str, value: float, buckets=LATENCY_BUCKETS_MS, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def register_collector(self, prefix: str, collect):
+        """Export the numeric values of collect() -> dict as gauges named <prefix>_<key>."""
+        self.collectors.append((prefix, collect))
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "counters": {_series(name, labels): value for (name, labels), value in self.counters.items()},
+                "histograms": {
+                    _series(name, labels): {"count": h.count, "sum": h.sum}
+                    for (name, labels), h in self.histograms.items()
+                },
+            }
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{_series(name, labels)} {value}")
+            for (name, labels), h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    cumulative += count
+                    lines.append(f"{_series(name + '_bucket', labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{_series(name + '_count', labels)} {h.count}")
+                lines.append(f"{_series(name + '_sum', labels)} {h.sum}")
+        for prefix, collect in self.collectors:
+            try:
+                values = collect()
+            except Exception as e:
+                print(f"Error collecting {prefix} metrics: {e}")
+                continue
+            for key, value in _flatten(values):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+def _series(name: str, labels) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+def _flatten(values: dict, prefix: str = ""):
+    for key, value in values.items():
+        key = f"{prefix}{key}".replace("-", "_").replace(".", "_")
+        if isinstance(value, dict):
+            yield from _flatten(value, key + "_")
+        else:
+            yield key, value
+
+metrics = MetricsRegistry()
+
+# =========================Turn Traces======================
+_traces = OrderedDict()
+_traces_lock = threading.Lock()
+
+def start_turn(thread_id):
+    """Begin a fresh trace for thread_id; spans recorded afterwards belong to this turn."""
+    if thread_id is None:
+        return
+    with _traces_lock:
+        _traces[str(thread_id)] = {"started_at": time.time(), "spans": []}
+        _traces.move_to_end(str(thread_id))
+        while len(_traces) > MAX_TRACED_THREADS:
+            _traces.popitem(last=False)
+
+def get_turn_trace(thread_id) -> list:
+    """Spans of the latest turn of thread_id, oldest first."""
+    with _traces_lock:
+        trace = _traces.get(str(thread_id))
+        return [dict(span) for span in trace["spans"]] if trace else []
+
+def _add_span(span: dict, thread_id=None):
+    thread_id = thread_id or current_thread_id.get()
+    if thread_id is None:
+        return
+    with _traces_lock:
+        trace = _traces.get(str(thread_id))
+        if trace is not None:
+            span["offset_ms"] = round((span.pop("started") - trace["started_at"]) * 1000, 1)
+            trace["spans"].append(span)
+
+class Span:
+    """Mutable record of one timed operation."""
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.error = None
+        self.payload_bytes = None
+
+    def mark_error(self, reason: str):
+        self.error = reason
+
+    def set_payload(self, payload):
+        """Record the size of a result (str/bytes length, or its JSON encoding)."""
+        if isinstance(payload, bytes):
+            self.payload_bytes = len(payload)
+        elif isinstance(payload, str):
+            self.payload_bytes = len(payload.encode())
+        else:
+            self.payload_bytes = len(json.dumps(payload, default=str).encode())
+
+@contextmanager
+def timed(kind: str, name: str, thread_id=None):
+    """
+    Time the block as <kind>_latency_ms{name=...}; count and trace failures.
+    The span goes to thread_id's trace, or the thread in current_thread_id.
+    """
+    span = Span(kind, name)
+    started = time.time()
+    start = time.perf_counter()
+    try:
+        yield span
+    except Exception as e:
+        span.mark_error(type(e).__name__)
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        metrics.observe(f"{kind}_latency_ms", elapsed_ms, name=name)
+        metrics.inc(f"{kind}_calls_total", name=name)
+        if span.error is not None:
+            metrics.inc(f"{kind}_errors_total", name=name, reason=span.error)
+        if span.payload_bytes is not None:
+            metrics.observe(f"{kind}_payload_bytes", span.payload_bytes, buckets=PAYLOAD_BUCKETS_BYTES, name=name)
+        _add_span({
+            "kind": kind,
+            "name": name,
+            "started": started,
+            "duration_ms": round(elapsed_ms, 1),
+            "error": span.error,
+            "payload_bytes": span.payload_bytes,
+        }, thread_id)
+
+def record_retries(count: int):
+    """Count HTTP retries against the tool currently running on this thread."""
+    if count:
+        metrics.inc("tool_retries_total", count, name=current_tool.get() or "unknown")
+
+def thread_id_from_config(config) -> str:
+    if not config:
+        return None
+    thread_id = config.get("configurable", {}).get("thread_id")
+    return None if thread_id is None else str(thread_id)
+
+# =========================Exporter======================
+def render_metrics() -> str:
+    return metrics.render()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/traces/"):
+            body = json.dumps(get_turn_trace(self.path[len("/traces/"):])).encode()
+            content_type = "application/json"
+        elif self.path in ("/", "/metrics"):
+            body = render_metrics().encode()
+            content_type = "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: int = 9108, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus text) and /traces/<thread_id> (JSON) from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-server").start()
+    return server
@@ -0,0 +1,122 @@
+"""
+Pre-LLM intent router.
+
+Cheap requests (greetings, jokes) are answered without an LLM round trip. All
+rules are compiled into one alternation of named groups, so a message is
+scanned once no matter how many rules exist. Rules use word boundaries, so
+"they" no longer matches "hey". Hit and miss counts are kept per rule.
+"""
+from langchain_core.messages import AIMessage
+import threading
+import random
+import re
+
+JOKE_CATEGORIES = ["Any", "Programming", "Pun", "Misc"]
+JOKE_MAX_COUNT = 10
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "another": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "some": 3, "few": 3, "couple": 2,
+}
+_NUMBER = r"\d+|" + "|".join(NUMBER_WORDS)
+_CATEGORY = r"programming|pun|misc|spooky|christmas|dark"
+
+class IntentRule:
+    """A named regex plus a handler that turns the match into an AIMessage (or None)."""
+
+    def __init__(self, name: str, pattern: str, handler):
+        self.name = name
+        self.pattern = pattern
+        self.handler = handler
+
+class IntentRouter:
+    """Matches every registered rule in a single regex pass."""
+
+    def __init__(self, rules=()):
+        self.rules = []
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.misses = 0
+        self.compiled = None
+        for rule in rules:
+            self.add_rule(rule)
+
+    def add_rule(self, rule: IntentRule):
+        """Register a rule. Earlier rules win when several match at the same position."""
+        self.rules.append(rule)
+        self.hits.setdefault(rule.name, 0)
+        self.compiled = re.compile(
+            "|".join(f"(?P<{r.name}>{r.pattern})" for r in self.rules), re.IGNORECASE
+        )
+
+    def route(self, text: str):
+        """Return (rule_name, AIMessage) for the first matching rule, or None to defer to the LLM."""
+        if self.compiled is not None:
+            for match in self.compiled.finditer(text):
+                rule = next(r for r in self.rules if match.group(r.name) is not None)
+                message = rule.handler(match, text)
+                if message is not None:
+                    with self.lock:
+                        self.hits[rule.name] += 1
+                    return rule.name, message
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = sum(self.hits.values()) + self.misses
+            return {
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "hit_rate": sum(self.hits.values()) / total if total else 0.0,
+            }
+
+# =========================Built-in Rules======================
+def greeting_handler(match, text):
+    return AIMessage(content="Hey there! I'm ready to help. What's on your mind?")
+
+def parse_count(value: str, plural: bool = False) -> int:
+    """Requested number of jokes, capped at JOKE_MAX_COUNT; None for a count of zero."""
+    if value is None:
+        return NUMBER_WORDS["some"] if plural else 1
+    value = value.lower()
+    count = int(value) if value.isdigit() else NUMBER_WORDS.get(value, 1)
+    if count < 1:
+        return None
+    return min(count, JOKE_MAX_COUNT)
+
+def joke_handler(match, text):
+    groups = match.groupdict()
+    plural = (groups.get("joke_noun") or groups.get("joke_noun_n") or "").lower() == "jokes"
+    count = parse_count(groups.get("joke_count") or groups.get("joke_count_n"), plural)
+    if count is None:
+        return None  # "tell me 0 jokes": let the LLM answer
+    category = groups.get("joke_category") or groups.get("joke_category_n")
+    if category:
+        categories = [category.capitalize()] * count
+    elif count == 1:
+        categories = ["Any"]
+    else:
+        categories = [random.choice(JOKE_CATEGORIES) for _ in range(count)]
+    tool_calls = [
+        {"name": "get_joke", "args": {"category": c}, "id": "joke_call" if count == 1 else f"joke_call_{i}"}
+        for i, c in enumerate(categories)
+    ]
+    return AIMessage(content="", tool_calls=tool_calls)
+
+DEFAULT_RULES = [
+    # Whole-message greetings only, so "hey, what's the weather in Paris?" still reaches the LLM
+    IntentRule("greeting", r"^\s*(?:hey|hi|hello)(?:\s+there)?[\s!.,]*$|\bhow\s+are\s+you\b", greeting_handler),
+    # A request verb ("tell me two jokes", "another joke") or a message that is only the request
+    # ("3 jokes", "jokes please"), so "I didn't like those two jokes" still reaches the LLM
+    IntentRule(
+        "joke",
+        rf"\b(?:(?:tell|give|send|share)\s+(?:me\s+|us\s+)?(?:(?P<joke_count>{_NUMBER})\s+)?(?:more\s+)?"
+        rf"|another\s+)(?:(?P<joke_category>{_CATEGORY})\s+)?(?P<joke_noun>jokes?)\b"
+        rf"|^\s*(?:(?P<joke_count_n>{_NUMBER})\s+)?(?:more\s+)?(?:(?P<joke_category_n>{_CATEGORY})\s+)?"
+        rf"(?P<joke_noun_n>jokes?)(?:\s+please)?[\s!.?]*$",
+        joke_handler,
+    ),
+]
+
+intent_router = IntentRouter(DEFAULT_RULES)
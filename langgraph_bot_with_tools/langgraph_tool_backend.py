@@ -1,29 +1,97 @@
 from langgraph.graph import StateGraph, START, END
 from typing import TypedDict, Annotated
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, AIMessage
-from langchain_groq import ChatGroq
-from langgraph.checkpoint.sqlite import SqliteSaver
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, AIMessage, ToolMessage, message_chunk_to_message
+from langgraph.constants import TAG_NOSTREAM
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
-from langchain_community.tools import DuckDuckGoSearchRun
 from langchain_core.tools import tool
+from langchain_core.runnables import RunnableConfig
 from dotenv import load_dotenv
-import sqlite3
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import lru_cache, partial
+from collections import OrderedDict
+from http_client import http_get
+from tool_cache import cached
+from stock_quotes import fetch_quote, get_quotes, quote_stats
+from tool_budget import budget_exceeded, current_turn, final_answer_request, previous_results, response_tokens, tool_signature
+from tool_registry import ToolRegistry
+from tool_results import shape_tool_result
+from turn_control import turn_controller, TurnRejected
+from response_cache import response_cache
+from tool_prefetch import tool_prefetcher, predict_tool_calls
+from fx_engine import fx_engine, UnknownCurrencyError, FX_MAX_CONVERSIONS
+from intent_router import intent_router
+from context_window import build_prompt, summary_cutoff, summary_request
+from instrumentation import (
+    metrics, timed, start_turn, start_metrics_server, get_turn_trace,
+    current_thread_id, current_tool, thread_id_from_config,
+)
+from http_client import get_pool_stats
+from tool_cache import tool_cache
+import contextvars
+import threading
+import asyncio
 import os
-import requests
 import json
-import random
+import time
 
 load_dotenv()
 
+# Heavy clients (Groq, DuckDuckGo, the checkpoint store, the compiled graph) are
+# built on first use by the cached get_* factories below, so importing this
+# module is cheap and Streamlit reruns do not pay for them again.
+
 # =========================LLM Setup======================
-llm = ChatGroq(
-    model="llama-3.1-8b-instant",
-    temperature=0.7,
-)
+@lru_cache(maxsize=None)
+def get_llm():
+    from langchain_groq import ChatGroq
+
+    return ChatGroq(
+        model="llama-3.1-8b-instant",
+        temperature=0.7,
+        streaming=True,
+    )
 
 # =========================Tools Setup======================
-search_tool = DuckDuckGoSearchRun()
+# Per-request timeout of web searches; a tool timeout cannot stop a call that is already running
+SEARCH_TIMEOUT = int(os.getenv("SEARCH_TIMEOUT", "8"))
+
+@lru_cache(maxsize=None)
+def get_search_tool():
+    from langchain_community.tools import DuckDuckGoSearchRun
+    from langchain_community.utilities.duckduckgo_search import DuckDuckGoSearchAPIWrapper
+
+    class TimedSearchWrapper(DuckDuckGoSearchAPIWrapper):
+        """DuckDuckGo text search whose HTTP requests time out after SEARCH_TIMEOUT seconds."""
+
+        def _ddgs_text(self, query, max_results=None):
+            from ddgs import DDGS
+
+            with DDGS(timeout=SEARCH_TIMEOUT) as ddgs:
+                results = ddgs.text(
+                    query,
+                    region=self.region,
+                    safesearch=self.safesearch,
+                    timelimit=self.time,
+                    max_results=max_results or self.max_results,
+                    backend=self.backend,
+                )
+                return list(results or [])
+
+    return DuckDuckGoSearchRun(api_wrapper=TimedSearchWrapper())
+
+# Seconds a cached result stays fresh for each idempotent upstream lookup
+TOOL_CACHE_TTLS = {
+    "fetch_weather": float(os.getenv("WEATHER_CACHE_TTL", "600")),
+    "get_nasa_apod": float(os.getenv("NASA_APOD_CACHE_TTL", "21600")),
+    "get_ip_location": float(os.getenv("IP_LOCATION_CACHE_TTL", "86400")),
+}
+
+# Upstream API endpoints; overridable so benchmarks and tests can point tools at local stand-ins
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "http://api.weatherapi.com/v1/current.json")
+NEWS_API_URL = os.getenv("NEWS_API_URL", "https://newsapi.org/v2/everything")
+JOKE_API_URL = os.getenv("JOKE_API_URL", "https://v2.jokeapi.dev/joke")
+NASA_APOD_URL = os.getenv("NASA_APOD_URL", "https://api.nasa.gov/planetary/apod")
+IP_LOCATION_URL = os.getenv("IP_LOCATION_URL", "https://ipapi.co")
 
 @tool
 def calculator_tool(first_num: float, second_num: float, operation: str) -> dict:
@@ -54,15 +122,24 @@ def get_stock_price(symbol: str) -> dict:
     Fetch the current stock price for a given symbol using Alpha Vantage API.
     symbol (str): The stock symbol (e.g., 'AAPL', 'GOOGL', 'MSFT')
     """
+    return fetch_quote(symbol)
+
+@tool
+def get_stock_quotes(symbols: list[str]) -> dict:
+    """
+    Fetch current stock prices for several symbols in one step (use this to compare tickers).
+    symbols (list[str]): The stock symbols (e.g., ['AAPL', 'MSFT', 'GOOGL'])
+    """
     try:
-        url = "https://www.alphavantage.co/query"
-        params = {'function': 'GLOBAL_QUOTE', 'symbol': symbol.upper(), 'apikey': os.getenv("ALPHA_VANTAGE_API_KEY")}
-        response = requests.get(url, params=params)
-        return response.json()
+        quotes = get_quotes(symbols)
+        if "error" in quotes:
+            return quotes
+        return {"quotes": quotes}
     except Exception as e:
         return {"error": str(e)}
 
 @tool
+@cached("fetch_weather", TOOL_CACHE_TTLS["fetch_weather"], key_fn=lambda city: city.strip().lower())
 def fetch_weather(city: str) -> dict:
     """
     Fetch the current weather for a given city using the WeatherAPI.
@@ -70,8 +147,8 @@ def fetch_weather(city: str) -> dict:
     """
     try:
         API_KEY = os.getenv("WEATHER_API_KEY")
-        url = f"http://api.weatherapi.com/v1/current.json?key={API_KEY}&q={city}"
-        r = requests.get(url)
+        url = WEATHER_API_URL
+        r = http_get(url, params={"key": API_KEY, "q": city})
         data = json.loads(r.text)
         if "error" in data:
             return {"error": data["error"]["message"]}
@@ -92,8 +169,8 @@ def fetch_news(topic: str) -> dict:
     """
     try:
         API_KEY = os.getenv("NEWS_API_KEY")
-        url = f"https://newsapi.org/v2/everything?q={topic}&apiKey={API_KEY}&pageSize=5"
-        r = requests.get(url)
+        url = NEWS_API_URL
+        r = http_get(url, params={"q": topic, "apiKey": API_KEY, "pageSize": 5})
         data = json.loads(r.text)
         if "articles" in data:
             return {"headlines": [article["title"] for article in data["articles"]]}
@@ -110,17 +187,35 @@ def convert_currency(amount: float, from_currency: str, to_currency: str) -> dic
     to_currency (str): Target currency (e.g., 'EUR').
     """
     try:
-        API_KEY = os.getenv("EXCHANGE_API_KEY")
-        url = f"https://openexchangerates.org/api/latest.json?app_id={API_KEY}"
-        r = requests.get(url)
-        data = json.loads(r.text)
-        if "rates" in data:
-            rate = data["rates"][to_currency] / data["rates"][from_currency]
-            result = amount * rate
-            return {"result": result}
-        return {"error": "Conversion failed."}
+        return {"result": fx_engine.convert(amount, from_currency, to_currency)}
+    except UnknownCurrencyError as e:
+        return {"error": str(e)}
     except Exception as e:
+        return {"error": f"Conversion failed: {str(e)}"}
+
+@tool
+def convert_currencies(conversions: list[dict]) -> dict:
+    """
+    Convert many amounts between currencies in one step.
+    conversions (list[dict]): Items like {"amount": 100, "from_currency": "USD", "to_currency": "EUR"}.
+    """
+    try:
+        if len(conversions) > FX_MAX_CONVERSIONS:
+            return {"error": f"At most {FX_MAX_CONVERSIONS} conversions per request."}
+        amounts = [float(c["amount"]) for c in conversions]
+        from_currencies = [c["from_currency"] for c in conversions]
+        to_currencies = [c["to_currency"] for c in conversions]
+        results = fx_engine.convert_many(amounts, from_currencies, to_currencies)
+        return {"results": [
+            {"amount": amount, "from_currency": src.strip().upper(), "to_currency": dst.strip().upper(), "result": value}
+            for amount, src, dst, value in zip(amounts, from_currencies, to_currencies, results.tolist())
+        ]}
+    except UnknownCurrencyError as e:
         return {"error": str(e)}
+    except KeyError as e:
+        return {"error": f"Each conversion needs amount, from_currency and to_currency (missing {e})."}
+    except Exception as e:
+        return {"error": f"Conversion failed: {str(e)}"}
 
 @tool
 def get_joke(category: str = "Any") -> dict:
@@ -129,8 +224,8 @@ def get_joke(category: str = "Any") -> dict:
     category (str): Joke category (e.g., 'Programming', 'Pun', 'Misc', 'Any'). Default: 'Any'.
     """
     try:
-        url = f"https://v2.jokeapi.dev/joke/{category}?type=single"
-        r = requests.get(url)
+        url = f"{JOKE_API_URL}/{category}"
+        r = http_get(url, params={"type": "single"})
         data = json.loads(r.text)
         if "joke" in data and data["joke"]:
             return {"joke": data["joke"]}
@@ -139,14 +234,15 @@ def get_joke(category: str = "Any") -> dict:
         return {"error": str(e)}
 
 @tool
+@cached("get_nasa_apod", TOOL_CACHE_TTLS["get_nasa_apod"])
 def get_nasa_apod() -> dict:
     """
     Fetch NASA's Astronomy Picture of the Day (APOD).
     """
     try:
         API_KEY = os.getenv("NASA_API_KEY")
-        url = f"https://api.nasa.gov/planetary/apod?api_key={API_KEY}"
-        r = requests.get(url)
+        url = NASA_APOD_URL
+        r = http_get(url, params={"api_key": API_KEY})
         data = json.loads(r.text)
         return {
             "title": data.get("title"),
@@ -157,14 +253,15 @@ def get_nasa_apod() -> dict:
         return {"error": str(e)}
 
 @tool
+@cached("get_ip_location", TOOL_CACHE_TTLS["get_ip_location"], key_fn=lambda ip: ip.strip())
 def get_ip_location(ip: str) -> dict:
     """
     Fetch location info for a given IP address.
     ip (str): The IP address (e.g., '8.8.8.8').
     """
     try:
-        url = f"https://ipapi.co/{ip}/json/"
-        r = requests.get(url)
+        url = f"{IP_LOCATION_URL}/{ip}/json/"
+        r = http_get(url)
         data = json.loads(r.text)
         return {
             "city": data.get("city"),
@@ -175,105 +272,820 @@ def get_ip_location(ip: str) -> dict:
     except Exception as e:
         return {"error": str(e)}
 
-tools = [search_tool, calculator_tool, get_stock_price, fetch_weather, fetch_news, convert_currency, get_joke, get_nasa_apod, get_ip_location]
-llm_with_tools = llm.bind_tools(tools=tools)
+def default_tools() -> list:
+    return [get_search_tool(), calculator_tool, get_stock_price, get_stock_quotes, fetch_weather, fetch_news, convert_currency, convert_currencies, get_joke, get_nasa_apod, get_ip_location]
+
+# Built-in tools whose identical calls within a turn may share one result; get_joke is random
+IDEMPOTENT_TOOLS = frozenset({
+    "duckduckgo_search", "calculator_tool", "get_stock_price", "get_stock_quotes", "fetch_weather",
+    "fetch_news", "convert_currency", "convert_currencies", "get_nasa_apod", "get_ip_location",
+})
+
+def default_registry() -> ToolRegistry:
+    """Built-in tools plus any plugins from entry points or TOOL_PLUGINS."""
+    return ToolRegistry(default_tools(), idempotent=IDEMPOTENT_TOOLS).load_plugins()
+
+class ChatComponents:
+    """The swappable pieces a chatbot graph is built from (real clients or test fakes)."""
+
+    def __init__(self, llm, tools):
+        self.llm = llm
+        # A plain tool list is wrapped in a registry with default limits
+        self.registry = tools if isinstance(tools, ToolRegistry) else ToolRegistry(tools, idempotent=IDEMPOTENT_TOOLS)
+        self.tools = self.registry.tools
+        self.llm_with_tools = llm.bind_tools(tools=self.registry.schemas())
+
+@lru_cache(maxsize=None)
+def get_components() -> ChatComponents:
+    return ChatComponents(get_llm(), default_registry())
 
 # =========================State===========================
 class ChatState(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
+    # Rolling summary of messages[:summarized_count]; the full history stays in messages
+    summary: str
+    summarized_count: int
+    # Per-turn tool-loop budget (see tool_budget), reset by summarize_node
+    turn_started_at: float
+    turn_tokens: int
 
 # =========================Graph Node Definition======================
-def chat_node(state: ChatState) -> dict:
+def fast_path_response(state: ChatState):
+    """Answer cheap requests without the LLM. Returns None when the LLM is needed."""
+    last_message = state["messages"][-1]
+    if not isinstance(last_message, HumanMessage) or not isinstance(last_message.content, str):
+        return None
+    routed = intent_router.route(last_message.content)
+    if routed is None:
+        return None
+    return {"messages": [routed[1]]}
+
+def cached_response(state: ChatState, components: ChatComponents):
+    """The response cache's answer to the turn's question, or None (also when the cache is off)."""
+    last_message = state["messages"][-1]
+    if not response_cache.enabled or not isinstance(last_message, HumanMessage) or not isinstance(last_message.content, str):
+        return None
+    answer = response_cache.lookup(last_message.content, components.registry.fingerprint())
+    if answer is None:
+        return None
+    metrics.inc("response_cache_hits_total")
+    return {"messages": [AIMessage(content=answer, response_metadata={"response_cache": "hit"})]}
+
+def remember_response(state: ChatState, response: AIMessage, components: ChatComponents):
+    """Store a final answer with the tools the turn used, unless a tool failed along the way."""
+    if not response_cache.enabled or response.tool_calls or not isinstance(response.content, str):
+        return
+    messages = state["messages"]
+    turn = current_turn(messages)
+    if len(turn) == len(messages) or any(getattr(m, "status", None) == "error" for m in turn):
+        return
+    question = messages[-len(turn) - 1].content
+    if isinstance(question, str):
+        tool_names = {tool_call["name"] for m in turn for tool_call in getattr(m, "tool_calls", None) or []}
+        response_cache.store(question, response.content, tool_names, components.registry.fingerprint())
+
+def begin_turn(config: RunnableConfig):
+    """First node of every turn: start a fresh trace for the conversation."""
+    thread_id = thread_id_from_config(config)
+    current_thread_id.set(thread_id)
+    start_turn(thread_id)
+
+# The sync and async nodes share everything but the model or tool call:
+# prepare_* builds the request from the state, finish_* turns the response
+# into the state update, and each node only makes (or awaits) the call.
+
+# Tagged nostream so summary tokens never reach the chat UI
+SUMMARY_CALL_CONFIG = {"tags": [TAG_NOSTREAM]}
+
+def prepare_summary(state: ChatState, config: RunnableConfig):
+    """Start the turn: (turn budget update, summary prompt or None when no summary is due, cutoff)."""
+    begin_turn(config)
+    turn_budget = {"turn_started_at": time.time(), "turn_tokens": 0}
+    cutoff = summary_cutoff(state)
+    return turn_budget, (summary_request(state, cutoff) if cutoff is not None else None), cutoff
+
+def summarize_node(state: ChatState, config: RunnableConfig = None, *, components: ChatComponents = None) -> dict:
+    """Start the turn's budget and fold older turns into the rolling summary once the history outgrows it."""
+    turn_budget, prompt, cutoff = prepare_summary(state, config)
+    if prompt is None:
+        return turn_budget
+    try:
+        with timed("llm", "summary"):
+            response = (components or get_components()).llm.invoke(prompt, config=SUMMARY_CALL_CONFIG)
+        return {**turn_budget, "summary": response.content, "summarized_count": cutoff}
+    except Exception as e:
+        # build_prompt still drops old turns to stay within the budget
+        print(f"Error in summarize_node: {str(e)}")
+        return turn_budget
+
+async def asummarize_node(state: ChatState, config: RunnableConfig = None, *, components: ChatComponents = None) -> dict:
+    """Async twin of summarize_node."""
+    turn_budget, prompt, cutoff = prepare_summary(state, config)
+    if prompt is None:
+        return turn_budget
+    try:
+        with timed("llm", "summary"):
+            response = await (components or get_components()).llm.ainvoke(prompt, config=SUMMARY_CALL_CONFIG)
+        return {**turn_budget, "summary": response.content, "summarized_count": cutoff}
+    except Exception as e:
+        print(f"Error in asummarize_node: {str(e)}")
+        return turn_budget
+
+def stream_llm(llm, prompt) -> AIMessage:
+    """
+    Call the model in streaming mode and merge the chunks into one message.
+    Tokens reach stream_mode="messages" consumers as they arrive, and
+    tool-call chunks are assembled incrementally by chunk addition.
+    """
+    response = None
+    for chunk in llm.stream(prompt):
+        response = chunk if response is None else response + chunk
+    return message_chunk_to_message(response) if response is not None else AIMessage(content="")
+
+async def astream_llm(llm, prompt) -> AIMessage:
+    """Async version of stream_llm."""
+    response = None
+    async for chunk in llm.astream(prompt):
+        response = chunk if response is None else response + chunk
+    return message_chunk_to_message(response) if response is not None else AIMessage(content="")
+
+CHAT_ERROR_MESSAGE = "Sorry, I hit an error. Please try again."
+
+def prepare_chat(state: ChatState, components: ChatComponents):
+    """
+    (answer, prompt) for a chat turn: the fast path's or the response cache's
+    answer when one applies (no LLM call), otherwise the prompt for the model.
+    """
+    fast_path = fast_path_response(state)
+    if fast_path is not None:
+        prefetch_tool_calls(state, components.registry, fast_path["messages"][-1].tool_calls)
+        return fast_path, None
+    cached = cached_response(state, components)
+    if cached is not None:
+        return cached, None
+    prefetch_tool_calls(state, components.registry)
+    return None, build_prompt(state)
+
+def finish_chat(state: ChatState, prompt, response: AIMessage, components: ChatComponents) -> dict:
+    """State update for the model's response."""
+    tool_prefetcher.settle(current_thread_id.get(), response.tool_calls)
+    remember_response(state, response, components)
+    return {"messages": [response], "turn_tokens": (state.get("turn_tokens") or 0) + response_tokens(prompt, response)}
+
+def chat_node(state: ChatState, config: RunnableConfig = None, *, components: ChatComponents = None) -> dict:
     """LLM node that handles conversation or requests a tool call."""
+    current_thread_id.set(thread_id_from_config(config))
     try:
-        last_message = state["messages"][-1].content.lower()
-        # Handle casual conversation
-        if "how are you" in last_message or "hey" in last_message:
-            return {"messages": [AIMessage(content="Hey there! I'm ready to help. What's on your mind?")]}
-        # Handle single joke request
-        elif "tell me a joke" in last_message or "another joke" in last_message:
-            return {"messages": [AIMessage(content="", tool_calls=[{"name": "get_joke", "args": {"category": "Any"}, "id": "joke_call"}])]}
-        # Handle multiple joke requests (e.g., "tell me 4 jokes")
-        elif "joke" in last_message and any(num in last_message for num in ["1", "2", "3", "4", "5"]):
-            try:
-                num_jokes = int(next(num for num in ["1", "2", "3", "4", "5"] if num in last_message))
-                tool_calls = [
-                    {"name": "get_joke", "args": {"category": random.choice(["Any", "Programming", "Pun", "Misc"])}, "id": f"joke_call_{i}"}
-                    for i in range(num_jokes)
-                ]
-                return {"messages": [AIMessage(content="", tool_calls=tool_calls)]}
-            except:
-                return {"messages": [AIMessage(content="", tool_calls=[{"name": "get_joke", "args": {"category": "Any"}, "id": "joke_call"}])]}
-        else:
-            response = llm_with_tools.invoke(state["messages"])
-            return {"messages": [response]}
+        components = components or get_components()
+        answer, prompt = prepare_chat(state, components)
+        if answer is not None:
+            return answer
+        with timed("llm", "chat") as span:
+            response = stream_llm(components.llm_with_tools, prompt)
+            span.set_payload(response.content)
+        return finish_chat(state, prompt, response, components)
     except Exception as e:
         print(f"Error in chat_node: {str(e)}")
-        return {"messages": [SystemMessage(content="Sorry, I hit an error. Please try again.")]}
+        return {"messages": [SystemMessage(content=CHAT_ERROR_MESSAGE)]}
 
-def custom_tools_node(state: ChatState) -> dict:
-    """Custom tools node to handle tool call results cleanly."""
+async def achat_node(state: ChatState, config: RunnableConfig = None, *, components: ChatComponents = None) -> dict:
+    """Async twin of chat_node: awaits the LLM instead of blocking a thread."""
+    current_thread_id.set(thread_id_from_config(config))
+    try:
+        components = components or get_components()
+        answer, prompt = prepare_chat(state, components)
+        if answer is not None:
+            return answer
+        with timed("llm", "chat") as span:
+            response = await astream_llm(components.llm_with_tools, prompt)
+            span.set_payload(response.content)
+        return finish_chat(state, prompt, response, components)
+    except Exception as e:
+        print(f"Error in achat_node: {str(e)}")
+        return {"messages": [SystemMessage(content=CHAT_ERROR_MESSAGE)]}
+
+# =========================Parallel Tool Execution======================
+# Independent tool calls from one AI message run side by side, so a turn costs
+# as much as its slowest tool instead of the sum of all of them.
+# A timed-out call cannot be interrupted: it keeps its pool thread until the
+# tool returns, which is why every tool also needs an I/O timeout of its own
+# (http_get defaults, SEARCH_TIMEOUT). Abandoned calls still running are
+# exported as tool_executor_abandoned_running.
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "8"))
+# Seconds a call may wait for a free pool thread before it is dropped unstarted
+TOOL_QUEUE_TIMEOUT = float(os.getenv("TOOL_QUEUE_TIMEOUT", "10"))
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool-call")
+_abandoned_running = 0
+_abandoned_lock = threading.Lock()
+
+class ToolQueueTimeout(FutureTimeoutError):
+    """The call never got a pool thread within TOOL_QUEUE_TIMEOUT and was cancelled."""
+
+class CallStarted(threading.Event):
+    """Set when a queued tool call starts running; `at` is its monotonic start time."""
+    at = None
+
+    def mark(self):
+        self.at = time.monotonic()
+        self.set()
+
+def abandon_tool_call(name: str, future):
+    """Count a timed-out call that is still running and keep the gauge until it returns."""
+    global _abandoned_running
+    metrics.inc("tool_calls_abandoned_total", name=name)
+    with _abandoned_lock:
+        _abandoned_running += 1
+
+    def finished(_):
+        global _abandoned_running
+        with _abandoned_lock:
+            _abandoned_running -= 1
+    future.add_done_callback(finished)
+
+def tool_executor_stats() -> dict:
+    with _abandoned_lock:
+        return {"abandoned_running": _abandoned_running, "queued": tool_executor._work_queue.qsize()}
+
+def rejected_tool_call(tool_call: dict, registry: ToolRegistry):
+    """Error content when the call names an unknown tool or has invalid arguments, else None."""
+    spec, problem = registry.check(tool_call)
+    if problem is None:
+        return None
+    metrics.inc("tool_errors_total", name=tool_call["name"], reason="unknown_tool" if spec is None else "invalid_args")
+    return f"Error: {problem}"
+
+def prepare_tool_call(tool_call: dict, registry: ToolRegistry):
+    """(spec, error content): the call's tool, or the error result for an unknown tool or invalid arguments."""
+    rejected = rejected_tool_call(tool_call, registry)
+    if rejected is not None:
+        return None, rejected
+    spec = registry.get(tool_call["name"])
+    current_tool.set(spec.name)
+    return spec, None
+
+def busy_tool_result(spec) -> str:
+    metrics.inc("tool_errors_total", name=spec.name, reason="concurrency")
+    return f"Error: {spec.name} is busy, too many calls at once"
+
+def finish_tool_call(spec, result, span) -> str:
+    """The tool result as message content, recorded on the call's span."""
+    if isinstance(result, dict) and "error" in result:
+        span.mark_error("tool_error")
+    content = shape_tool_result(spec.name, result)
+    span.set_payload(content)
+    return content
+
+def run_tool_call(tool_call: dict, registry: ToolRegistry) -> str:
+    """Execute a single tool call; unknown tools and invalid arguments get an error result."""
+    spec, rejected = prepare_tool_call(tool_call, registry)
+    if rejected is not None:
+        return rejected
+    if spec.slots is not None and not spec.slots.acquire(timeout=spec.timeout):
+        return busy_tool_result(spec)
+    try:
+        with timed("tool", spec.name) as span:
+            return finish_tool_call(spec, spec.tool.invoke(tool_call["args"]), span)
+    finally:
+        if spec.slots is not None:
+            spec.slots.release()
+
+def wait_for_tool_call(future, timeout: float, dispatched: float) -> str:
+    """
+    The result of a submitted call, allowing `timeout` seconds from when it
+    started running. A call still queued TOOL_QUEUE_TIMEOUT after dispatch is
+    cancelled (ToolQueueTimeout); one running past its timeout raises
+    FutureTimeoutError and keeps running.
+    """
+    started = future.started
+    if not started.wait(max(0.0, dispatched + TOOL_QUEUE_TIMEOUT - time.monotonic())):
+        if future.cancel():
+            raise ToolQueueTimeout()
+        started.wait(timeout)  # a thread picked it up just now
+    started_at = started.at if started.at is not None else time.monotonic()
+    return future.result(timeout=max(0.0, started_at + timeout - time.monotonic()))
+
+def execute_tool_calls(tool_calls: list, registry: ToolRegistry) -> list:
+    """
+    Dispatch all tool calls at once on the shared pool.
+    Returns (tool_call, content) pairs in the same order as tool_calls. A call
+    gets an error result when it does not finish within its tool's timeout of
+    starting, or does not start within TOOL_QUEUE_TIMEOUT because every pool
+    thread is busy. A timeout does not stop the tool (see above).
+    """
+    dispatched = time.monotonic()
+    thread_id = current_thread_id.get()
+    futures = [
+        (tool_call, tool_prefetcher.claim(thread_id, tool_call) or submit_tool_call(tool_call, registry))
+        for tool_call in tool_calls
+    ]
+    results = []
+    for tool_call, future in futures:
+        timeout = registry.timeout_for(tool_call["name"])
+        try:
+            content = wait_for_tool_call(future, timeout, dispatched)
+        except ToolQueueTimeout:
+            metrics.inc("tool_errors_total", name=tool_call["name"], reason="queue_timeout")
+            content = f"Error: {tool_call['name']} did not start, all tool threads are busy"
+        except FutureTimeoutError:
+            metrics.inc("tool_errors_total", name=tool_call["name"], reason="timeout")
+            abandon_tool_call(tool_call["name"], future)
+            content = f"Error: {tool_call['name']} timed out after {timeout:g}s"
+        except Exception as e:
+            content = f"Error: {str(e)}"
+        results.append((tool_call, content))
+    return results
+
+def split_repeated_calls(messages, tool_calls: list, registry: ToolRegistry):
+    """
+    Tool calls that need to run, and the signature -> result map of calls
+    already answered this turn. A call to an idempotent tool identical to an
+    earlier one (or to another call in the same message) is answered from
+    that result; calls to other tools always run.
+    """
+    known = previous_results(messages)
+    to_run, seen = [], set()
+    for tool_call in tool_calls:
+        spec = registry.get(tool_call["name"])
+        if spec is None or not spec.idempotent:
+            to_run.append(tool_call)
+            continue
+        signature = tool_signature(tool_call)
+        if signature in known or signature in seen:
+            metrics.inc("tool_calls_deduplicated_total", name=tool_call["name"])
+            continue
+        seen.add(signature)
+        to_run.append(tool_call)
+    return to_run, known
+
+def tool_message(tool_call: dict, content: str) -> ToolMessage:
+    status = "error" if content.startswith("Error: ") else "success"
+    return ToolMessage(content=content, tool_call_id=tool_call["id"], name=tool_call["name"], status=status)
+
+def tool_result_messages(tool_calls: list, executed: list, known: dict) -> list:
+    """One ToolMessage per tool call, in call order; calls that did not run get their twin's result."""
+    by_id = {tool_call["id"]: content for tool_call, content in executed}
+    by_signature = dict(known)
+    for tool_call, content in executed:
+        by_signature.setdefault(tool_signature(tool_call), content)
+    return [
+        tool_message(tool_call, by_id[tool_call["id"]] if tool_call["id"] in by_id else by_signature[tool_signature(tool_call)])
+        for tool_call in tool_calls
+    ]
+
+def prepare_tools(state: ChatState, config: RunnableConfig, components: ChatComponents):
+    """(registry, calls to run, results already known) for the pending tool calls, or None when there are none."""
+    current_thread_id.set(thread_id_from_config(config))
     messages = state["messages"]
     last_message = messages[-1]
-    if hasattr(last_message, "tool_calls") and last_message.tool_calls:
-        tool_results = []
-        for tool_call in last_message.tool_calls:
-            tool_name = tool_call["name"]
-            tool_args = tool_call["args"]
-            tool_id = tool_call["id"]
-            # Find and execute the tool
-            for tool in tools:
-                if tool.name == tool_name:
-                    result = tool.invoke(tool_args)
-                    # Convert result to string if it's a dict
-                    if isinstance(result, dict):
-                        if "joke" in result:
-                            result = result["joke"]
-                        elif "error" in result:
-                            result = f"Error: {result['error']}"
-                        else:
-                            result = json.dumps(result)
-                    tool_results.append(AIMessage(content=result, tool_call_id=tool_id))
-        return {"messages": tool_results}
-    return {"messages": []}
+    if not (hasattr(last_message, "tool_calls") and last_message.tool_calls):
+        return None
+    registry = (components or get_components()).registry
+    to_run, known = split_repeated_calls(messages[:-1], last_message.tool_calls, registry)
+    return registry, to_run, known
+
+def finish_tools(state: ChatState, executed: list, known: dict) -> dict:
+    return {"messages": tool_result_messages(state["messages"][-1].tool_calls, executed, known)}
+
+def custom_tools_node(state: ChatState, config: RunnableConfig = None, *, components: ChatComponents = None) -> dict:
+    """Custom tools node to handle tool call results cleanly."""
+    pending = prepare_tools(state, config, components)
+    if pending is None:
+        return {"messages": []}
+    registry, to_run, known = pending
+    return finish_tools(state, execute_tool_calls(to_run, registry), known)
+
+async def arun_tool_call(tool_call: dict, registry: ToolRegistry) -> str:
+    """Async version of run_tool_call."""
+    spec, rejected = prepare_tool_call(tool_call, registry)
+    if rejected is not None:
+        return rejected
+    if spec.slots is not None and not await asyncio.to_thread(spec.slots.acquire, timeout=spec.timeout):
+        return busy_tool_result(spec)
+    try:
+        with timed("tool", spec.name) as span:
+            return finish_tool_call(spec, await spec.tool.ainvoke(tool_call["args"]), span)
+    finally:
+        if spec.slots is not None:
+            spec.slots.release()
+
+async def aexecute_tool_calls(tool_calls: list, registry: ToolRegistry) -> list:
+    """
+    Run all tool calls concurrently on the event loop, each with its tool's
+    timeout. As in the sync path, a sync tool that times out keeps running on
+    its executor thread.
+    """
+    thread_id = current_thread_id.get()
+
+    async def run_one(tool_call):
+        timeout = registry.timeout_for(tool_call["name"])
+        prefetched = tool_prefetcher.claim(thread_id, tool_call)
+        try:
+            if prefetched is not None:
+                return await asyncio.wait_for(asyncio.wrap_future(prefetched), timeout)
+            return await asyncio.wait_for(arun_tool_call(tool_call, registry), timeout)
+        except asyncio.TimeoutError:
+            metrics.inc("tool_errors_total", name=tool_call["name"], reason="timeout")
+            if prefetched is not None and not prefetched.done():
+                abandon_tool_call(tool_call["name"], prefetched)
+            else:
+                metrics.inc("tool_calls_abandoned_total", name=tool_call["name"])
+            return f"Error: {tool_call['name']} timed out after {timeout:g}s"
+        except Exception as e:
+            return f"Error: {str(e)}"
+    contents = await asyncio.gather(*(run_one(tool_call) for tool_call in tool_calls))
+    return list(zip(tool_calls, contents))
+
+async def acustom_tools_node(state: ChatState, config: RunnableConfig = None, *, components: ChatComponents = None) -> dict:
+    """Async twin of custom_tools_node."""
+    pending = prepare_tools(state, config, components)
+    if pending is None:
+        return {"messages": []}
+    registry, to_run, known = pending
+    return finish_tools(state, await aexecute_tool_calls(to_run, registry), known)
+
+# =========================Speculative Prefetch======================
+def run_started_tool_call(started: CallStarted, tool_call: dict, registry: ToolRegistry) -> str:
+    started.mark()
+    return run_tool_call(tool_call, registry)
+
+def submit_tool_call(tool_call: dict, registry: ToolRegistry):
+    """Queue a call on the shared pool; future.started is set once a thread picks it up."""
+    started = CallStarted()
+    future = tool_executor.submit(contextvars.copy_context().run, run_started_tool_call, started, tool_call, registry)
+    future.started = started
+    return future
+
+def prefetch_tool_calls(state: ChatState, registry: ToolRegistry, tool_calls: list = None):
+    """
+    At the start of a turn, start the given tool calls (or the ones the user's
+    message predicts) so tools_node can pick up their results; see tool_prefetch.
+    """
+    last_message = state["messages"][-1]
+    if not tool_prefetcher.enabled or not isinstance(last_message, HumanMessage) or not isinstance(last_message.content, str):
+        return
+    if tool_calls is None:
+        tool_calls = predict_tool_calls(last_message.content, registry.specs)
+    tool_prefetcher.start(current_thread_id.get(), tool_calls, partial(submit_tool_call, registry=registry))
+
+# =========================Tool Budget======================
+def skipped_tool_results(tool_calls: list, description: str) -> list:
+    """Results for tool calls the budget did not allow, so every call still gets an answer."""
+    return [
+        tool_message(tool_call, f"Error: not run, the tool budget for this request is used up ({description}).")
+        for tool_call in tool_calls
+    ]
+
+FINAL_ANSWER_ERROR_MESSAGE = "Sorry, I couldn't finish looking that up. Please try a narrower question."
+
+def prepare_final_answer(state: ChatState, config: RunnableConfig):
+    """(results closing the pending tool calls, prompt asking for an answer without tools)."""
+    current_thread_id.set(thread_id_from_config(config))
+    limit, description = budget_exceeded(state) or ("tool_budget", "tool budget used up")
+    metrics.inc("tool_budget_exhausted_total", limit=limit)
+    skipped = skipped_tool_results(state["messages"][-1].tool_calls, description)
+    prompt = final_answer_request(build_prompt({**state, "messages": state["messages"] + skipped}), description)
+    return skipped, prompt
+
+def final_answer_node(state: ChatState, config: RunnableConfig = None, *, components: ChatComponents = None) -> dict:
+    """Budget exhausted: close the pending tool calls and have the model answer without tools."""
+    skipped, prompt = prepare_final_answer(state, config)
+    try:
+        with timed("llm", "final_answer") as span:
+            response = stream_llm((components or get_components()).llm, prompt)
+            span.set_payload(response.content)
+    except Exception as e:
+        print(f"Error in final_answer_node: {str(e)}")
+        response = AIMessage(content=FINAL_ANSWER_ERROR_MESSAGE)
+    return {"messages": skipped + [response]}
+
+async def afinal_answer_node(state: ChatState, config: RunnableConfig = None, *, components: ChatComponents = None) -> dict:
+    """Async twin of final_answer_node."""
+    skipped, prompt = prepare_final_answer(state, config)
+    try:
+        with timed("llm", "final_answer") as span:
+            response = await astream_llm((components or get_components()).llm, prompt)
+            span.set_payload(response.content)
+    except Exception as e:
+        print(f"Error in afinal_answer_node: {str(e)}")
+        response = AIMessage(content=FINAL_ANSWER_ERROR_MESSAGE)
+    return {"messages": skipped + [response]}
+
+# =========================Metrics======================
+metrics.register_collector("http_pool", get_pool_stats)
+metrics.register_collector("tool_cache", tool_cache.stats)
+metrics.register_collector("intent_router", intent_router.stats)
+metrics.register_collector("stock_quotes", quote_stats)
+metrics.register_collector("fx", fx_engine.stats)
+metrics.register_collector("turn_control", turn_controller.stats)
+metrics.register_collector("response_cache", response_cache.stats)
+metrics.register_collector("tool_prefetch", tool_prefetcher.stats)
+metrics.register_collector("tool_executor", tool_executor_stats)
 
 # =========================Database Setup======================
-conn = sqlite3.connect(database="chatbot.db", check_same_thread=False)
-checkpointer = SqliteSaver(conn=conn)
+@lru_cache(maxsize=None)
+def get_storage():
+    """
+    The checkpointer with its thread index and history search index, created on first use.
+    Storage backend comes from CHECKPOINT_URL (memory://, sqlite:///path, postgresql://...).
+    """
+    from checkpoint_store import create_checkpointer, PooledSqliteSaver
+    from checkpoint_compaction import CHECKPOINT_COMPACTION_INTERVAL, start_compaction_job
+    from thread_index import ThreadIndex
+    from history_search import HistorySearch
 
-# =========================Graph Definition======================
-graph = StateGraph(ChatState)
-graph.add_node("chat_node", chat_node)
-graph.add_node("tools_node", custom_tools_node)
+    checkpointer = create_checkpointer()
+    thread_index = ThreadIndex().attach(checkpointer)
+    history_search = HistorySearch().attach(checkpointer)
+    # Optional background retention job; policy comes from the CHECKPOINT_* env vars
+    if CHECKPOINT_COMPACTION_INTERVAL and isinstance(checkpointer, PooledSqliteSaver):
+        start_compaction_job(checkpointer.database)
+    return checkpointer, thread_index, history_search
+
+def open_read_storage(url: str = None):
+    """
+    (checkpoint reader, thread index, history search) for a process that only
+    serves reads: plain SQLite connections without the group-commit writer,
+    index backfill or compaction job. Other backends use the full storage.
+    """
+    from checkpoint_store import CHECKPOINT_URL, connect_sqlite
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    from thread_index import ThreadIndex
+    from history_search import HistorySearch
+
+    url = url or CHECKPOINT_URL
+    if not url.startswith("sqlite:///"):
+        return get_storage()
+    return SqliteSaver(connect_sqlite(url[len("sqlite:///"):])), ThreadIndex(), HistorySearch()
+
+_read_storage = None
+
+def use_read_storage(url: str = None):
+    """Serve thread lists, search and history pages from open_read_storage() in this process."""
+    global _read_storage
+    _read_storage = open_read_storage(url)
+
+def get_checkpointer():
+    return get_storage()[0]
+
+def get_checkpoint_reader():
+    """Checkpointer used for history reads."""
+    return _read_storage[0] if _read_storage else get_checkpointer()
 
-graph.add_edge(START, "chat_node")
+def get_thread_index():
+    return _read_storage[1] if _read_storage else get_storage()[1]
 
+def get_history_search():
+    return _read_storage[2] if _read_storage else get_storage()[2]
+
+# =========================Graph Definition======================
 def route_tools(state: ChatState):
     messages = state["messages"]
     last_message = messages[-1]
     if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
+        # Over the turn's budget: answer with what we have instead of looping again
+        if budget_exceeded(state) is not None:
+            return "final_answer_node"
         return "tools_node"
     return "__end__"
 
-graph.add_conditional_edges(
-    "chat_node",
-    route_tools,
-    {
-        "tools_node": "tools_node",
-        "__end__": END,
-    }
-)
+def build_graph(summarize, chat, tools_node, final_answer) -> StateGraph:
+    """Wire the summarize -> chat/tools loop around the given (sync or async) node functions."""
+    graph = StateGraph(ChatState)
+    graph.add_node("summarize_node", summarize)
+    graph.add_node("chat_node", chat)
+    graph.add_node("tools_node", tools_node)
+    graph.add_node("final_answer_node", final_answer)
+
+    graph.add_edge(START, "summarize_node")
+    graph.add_edge("summarize_node", "chat_node")
+
+    graph.add_conditional_edges(
+        "chat_node",
+        route_tools,
+        {
+            "tools_node": "tools_node",
+            "final_answer_node": "final_answer_node",
+            "__end__": END,
+        }
+    )
+
+    graph.add_edge("tools_node", "chat_node")
+    graph.add_edge("final_answer_node", END)
+    return graph
+
+def build_chatbot(components: ChatComponents = None, checkpointer=None):
+    """
+    Compile the sync graph. Pass fake components and e.g. an InMemorySaver to
+    build it without network clients; defaults are the shared real ones.
+    """
+    nodes = (summarize_node, chat_node, custom_tools_node, final_answer_node)
+    if components is not None:
+        nodes = tuple(partial(node, components=components) for node in nodes)
+    return build_graph(*nodes).compile(checkpointer=checkpointer if checkpointer is not None else get_checkpointer())
 
-graph.add_edge("tools_node", "chat_node")
+@lru_cache(maxsize=None)
+def get_chatbot():
+    """The process-wide compiled chatbot, built on first call."""
+    if os.getenv("METRICS_PORT"):
+        start_metrics_server(int(os.getenv("METRICS_PORT")))
+    return build_chatbot()
 
-chatbot = graph.compile(checkpointer=checkpointer)
+# =========================Async Graph======================
+def open_sqlite_indexes(database: str):
+    """Thread index and history search stored in a SQLite checkpoint database, backfilled from it when empty."""
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    from checkpoint_store import connect_sqlite
+    from thread_index import ThreadIndex
+    from history_search import HistorySearch
+
+    indexes = (ThreadIndex(database), HistorySearch(database))
+    empty = [index for index in indexes if index.count() == 0]
+    if empty:
+        saver = SqliteSaver(connect_sqlite(database))
+        saver.setup()
+        try:
+            for index in empty:
+                index.backfill(saver)
+        finally:
+            saver.conn.close()
+    return indexes
+
+async def build_async_chatbot(database: str = "chatbot.db", components: ChatComponents = None):
+    """
+    Compile the graph with async nodes and an AsyncSqliteSaver checkpointer.
+    Drive it with `await chatbot.ainvoke(...)` or `async for ... in chatbot.astream(...)`
+    so many conversations can share one event loop. The thread index and
+    history search are kept in the same database. Requires `aiosqlite`;
+    close the connection with `await chatbot.checkpointer.conn.close()` when done.
+    """
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    from checkpoint_store import with_hooks
+
+    thread_index, history_search = await asyncio.to_thread(open_sqlite_indexes, database)
+    aconn = await aiosqlite.connect(database)
+    acheckpointer = with_hooks(AsyncSqliteSaver)(aconn)
+    acheckpointer.add_put_listener(thread_index.record_checkpoint)
+    acheckpointer.add_put_listener(history_search.record_checkpoint)
+    nodes = (asummarize_node, achat_node, acustom_tools_node, afinal_answer_node)
+    if components is not None:
+        nodes = tuple(partial(node, components=components) for node in nodes)
+    return build_graph(*nodes).compile(checkpointer=acheckpointer)
+
+# Lazily resolved module attributes kept for existing imports
+# (`from langgraph_tool_backend import chatbot` still works).
+_LAZY_ATTRIBUTES = {
+    "chatbot": get_chatbot,
+    "checkpointer": get_checkpointer,
+    "thread_index": get_thread_index,
+    "history_search": get_history_search,
+    "llm": get_llm,
+    "search_tool": get_search_tool,
+    "tools": lambda: get_components().tools,
+    "llm_with_tools": lambda: get_components().llm_with_tools,
+}
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # =========================Database Operations======================
-def retrieve_all_threads():
-    all_threads = set()
+def retrieve_all_threads(limit: int = None, offset: int = 0):
+    """Thread ids from the thread index, most recently updated first."""
+    try:
+        return [row["thread_id"] for row in get_thread_index().list_threads(limit=limit, offset=offset)]
+    except Exception as e:
+        print(f"Error retrieving threads: {e}")
+        return []
+
+def retrieve_thread_summaries(limit: int = 50, offset: int = 0):
+    """Index rows (thread_id, created_at, last_updated, message_count, title) for one page."""
     try:
-        for checkpoint in checkpointer.list(None):
-            all_threads.add(checkpoint["config"]["configurable"]["thread_id"])
+        return get_thread_index().list_threads(limit=limit, offset=offset)
     except Exception as e:
         print(f"Error retrieving threads: {e}")
-    return list(all_threads)
\ No newline at end of file
+        return []
+
+def search_history(query: str, limit: int = 20):
+    """
+    Ranked full-text matches over all conversations, one per thread:
+    dicts with thread_id, position, role, snippet, rank and the thread's title.
+    """
+    try:
+        hits = get_history_search().search(query, limit=limit)
+        thread_index = get_thread_index()
+        for hit in hits:
+            row = thread_index.get(hit["thread_id"])
+            hit["title"] = row["title"] if row else None
+        return hits
+    except Exception as e:
+        print(f"Error searching history: {e}")
+        return []
+
+# =========================Turn Events======================
+def stream_turn_events(user_input: str, config: dict):
+    """
+    Run one chat turn (the graph executes exactly once) and yield structured events:
+        {"type": "token", "content": ...}                          model text as it streams
+        {"type": "tool_started", "name": ..., "args": ..., "id": ...}
+        {"type": "tool_result", "name": ..., "id": ..., "content": ...}
+        {"type": "error", "error": ...}                            turn refused, thread busy
+        {"type": "done"}
+    Turns on the same thread run one at a time; a duplicate of an in-flight
+    input follows the original instead of running again (see turn_control).
+    """
+    thread_id = thread_id_from_config(config)
+    try:
+        yield from turn_controller.run(thread_id, user_input, partial(graph_turn_events, user_input, config))
+    except TurnRejected as e:
+        yield {"type": "error", "error": str(e)}
+        yield {"type": "done"}
+
+# Nodes whose model output is shown to the user
+ANSWER_NODES = ("chat_node", "final_answer_node")
+
+def graph_turn_events(user_input: str, config: dict):
+    """The events of one graph run, without turn control."""
+    tool_names = {}
+    for mode, payload in get_chatbot().stream(
+        {"messages": [HumanMessage(content=user_input)]},
+        config=config,
+        stream_mode=["messages", "updates"],
+    ):
+        if mode == "messages":
+            message_chunk, metadata = payload
+            if (metadata.get("langgraph_node") in ANSWER_NODES and isinstance(message_chunk, AIMessage)
+                    and getattr(message_chunk, "tool_call_id", None) is None):
+                if isinstance(message_chunk.content, str) and message_chunk.content:
+                    yield {"type": "token", "content": message_chunk.content}
+            continue
+        for node, update in payload.items():
+            for message in (update or {}).get("messages", []):
+                if node == "chat_node" and getattr(message, "tool_calls", None):
+                    for tool_call in message.tool_calls:
+                        tool_names[tool_call["id"]] = tool_call["name"]
+                        yield {"type": "tool_started", "name": tool_call["name"], "args": tool_call["args"], "id": tool_call["id"]}
+                elif node == "tools_node":
+                    tool_call_id = getattr(message, "tool_call_id", None)
+                    yield {"type": "tool_result", "name": tool_names.get(tool_call_id), "id": tool_call_id, "content": message.content}
+    yield {"type": "done"}
+
+# =========================History Pages======================
+# Thread switches render the newest page first and load older pages on demand.
+# Paging bounds what is sent and rendered, not what is read: messages are stored
+# in the thread's latest checkpoint, so a cache miss still loads and converts
+# the whole conversation. Converted histories are cached and reused until the
+# thread index reports a newer checkpoint, so switching back to a thread or
+# loading older pages skips the checkpoint read. The cache is bounded by the
+# total number of messages it holds; longer histories are not cached.
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "30"))
+HISTORY_CACHE_MESSAGES = int(os.getenv("HISTORY_CACHE_MESSAGES", "5000"))
+_history_cache = OrderedDict()
+_history_cached_messages = 0
+_history_lock = threading.Lock()
+
+def message_to_history(message) -> dict:
+    """UI entry for a stored message, or None for messages with nothing to show."""
+    if not isinstance(message.content, str) or not message.content.strip():
+        return None
+    role = "user" if isinstance(message, HumanMessage) else "assistant"
+    return {"role": role, "content": message.content}
+
+def thread_history(thread_id) -> list:
+    """All displayable messages of a thread, served from cache while it is current."""
+    global _history_cached_messages
+    key = str(thread_id)
+    row = get_thread_index().get(key)
+    version = row["last_updated"] if row else None
+    with _history_lock:
+        cached = _history_cache.get(key)
+        if cached is not None and version is not None and cached[0] == version:
+            _history_cache.move_to_end(key)
+            return cached[1]
+    checkpoint_tuple = get_checkpoint_reader().get_tuple({"configurable": {"thread_id": key}})
+    messages = checkpoint_tuple.checkpoint["channel_values"].get("messages", []) if checkpoint_tuple else []
+    history = [entry for entry in map(message_to_history, messages) if entry is not None]
+    with _history_lock:
+        previous = _history_cache.pop(key, None)
+        if previous is not None:
+            _history_cached_messages -= len(previous[1])
+        if len(history) <= HISTORY_CACHE_MESSAGES:
+            _history_cache[key] = (version, history)
+            _history_cached_messages += len(history)
+        while _history_cached_messages > HISTORY_CACHE_MESSAGES:
+            _, (_, evicted) = _history_cache.popitem(last=False)
+            _history_cached_messages -= len(evicted)
+    return history
+
+def load_history_page(thread_id, limit: int = HISTORY_PAGE_SIZE, end: int = None):
+    """
+    One page of a thread's history: the `limit` messages before index `end`
+    (default: the newest ones). Returns (messages, start); start == 0 means
+    there is nothing older to load. Pages are cut from thread_history(), so an
+    uncached thread is read in full once (see above).
+    """
+    history = thread_history(thread_id)
+    end = len(history) if end is None else min(end, len(history))
+    start = max(0, end - limit)
+    return history[start:end], start
@@ -1,8 +1,15 @@
 import streamlit as st
-from langgraph_tool_backend import chatbot, retrieve_all_threads
-from langchain_core.messages import HumanMessage, AIMessage
 import uuid
-import json
+import os
+
+if os.getenv("CHATBOT_SERVER_URL"):
+    # Thin client of server.py: the graph runs in the server's worker processes
+    from chat_client import retrieve_all_threads, get_turn_trace, load_history_page, search_history, stream_turn_events
+else:
+    from langgraph_tool_backend import retrieve_all_threads, get_turn_trace, load_history_page, search_history, stream_turn_events
+
+# Threads listed per sidebar page; older ones load with "Load more conversations"
+THREAD_PAGE_SIZE = 50
 
 # ===================Thread_id=========================
 def generate_thread_id():
@@ -14,23 +21,47 @@ def reset_chat():
     st.session_state["thread_id"] = thread_id
     add_thread(st.session_state["thread_id"])
     st.session_state["message_history"] = []
+    st.session_state["history_start"] = 0
 
 def add_thread(thread_id):
+    # The list is newest first, like the thread index
     if thread_id not in st.session_state["chat_threads"]:
-        st.session_state["chat_threads"].append(thread_id)
+        st.session_state["chat_threads"].insert(0, thread_id)
+
+def load_more_threads():
+    page = retrieve_all_threads(limit=THREAD_PAGE_SIZE, offset=st.session_state["threads_offset"])
+    st.session_state["threads_offset"] += len(page)
+    st.session_state["threads_exhausted"] = len(page) < THREAD_PAGE_SIZE
+    listed = {str(t) for t in st.session_state["chat_threads"]}
+    st.session_state["chat_threads"].extend(t for t in page if str(t) not in listed)
 
 def load_thread(thread_id):
-    return chatbot.get_state(config={"configurable": {"thread_id": thread_id}}).values["messages"]
+    # Newest page only; older pages are fetched with "Load older messages"
+    return load_history_page(thread_id)
+
+def open_thread(thread_id):
+    # Reuse the sidebar's entry so a thread opened from search is not listed twice
+    thread_id = next((t for t in st.session_state["chat_threads"] if str(t) == str(thread_id)), thread_id)
+    add_thread(thread_id)
+    st.session_state["thread_id"] = thread_id
+    messages, start = load_thread(thread_id)
+    st.session_state["message_history"] = messages
+    st.session_state["history_start"] = start
 
 # =====================Session Setups=======================
 if "message_history" not in st.session_state:
     st.session_state["message_history"] = []
 
+if "history_start" not in st.session_state:
+    st.session_state["history_start"] = 0
+
 if "thread_id" not in st.session_state:
     st.session_state["thread_id"] = generate_thread_id()
 
 if "chat_threads" not in st.session_state:
-    st.session_state["chat_threads"] = retrieve_all_threads()
+    st.session_state["chat_threads"] = []
+    st.session_state["threads_offset"] = 0
+    load_more_threads()
 
 add_thread(st.session_state["thread_id"])
 
@@ -41,17 +72,32 @@ if st.sidebar.button("New Chat"):
 
 st.sidebar.header("Conversation History")
 
+# Full-text search over every conversation; a hit opens its thread
+search_text = st.sidebar.text_input("Search conversations")
+if search_text.strip():
+    hits = search_history(search_text)
+    if not hits:
+        st.sidebar.caption("No matches")
+    for i, hit in enumerate(hits):
+        if st.sidebar.button(f"{hit.get('title') or hit['thread_id']} — {hit['snippet']}", key=f"search_{i}_{hit['thread_id']}"):
+            open_thread(hit["thread_id"])
+
 for thread_id in st.session_state["chat_threads"]:
     if st.sidebar.button(str(thread_id), key=str(thread_id)):
-        st.session_state["thread_id"] = thread_id
-        messages = load_thread(thread_id)
-        temp_history = []
-        for msg in messages:
-            role = "user" if isinstance(msg, HumanMessage) else "assistant"
-            temp_history.append({"role": role, "content": msg.content})
-        st.session_state["message_history"] = temp_history
+        open_thread(thread_id)
+
+if not st.session_state["threads_exhausted"] and st.sidebar.button("Load more conversations"):
+    load_more_threads()
+    st.rerun()
 
 # =====================Main UI======================
+# Older pages load on demand so long threads render only their newest messages
+if st.session_state["history_start"] > 0:
+    if st.button("⬆️ Load older messages"):
+        older, start = load_history_page(st.session_state["thread_id"], end=st.session_state["history_start"])
+        st.session_state["message_history"] = older + st.session_state["message_history"]
+        st.session_state["history_start"] = start
+
 for message in st.session_state["message_history"]:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
@@ -72,42 +118,21 @@ if user_input:
 
     with st.chat_message("assistant"):
         def ai_only_stream():
-            for message_chunk, metadata in chatbot.stream(
-                {"messages": [HumanMessage(content=user_input)]},
-                config=CONFIG,
-                stream_mode="messages"
-            ):
-                if isinstance(message_chunk, AIMessage):
-                    if message_chunk.content and message_chunk.content.strip():
-                        # Yield direct AI message content (e.g., for "how are you")
-                        yield message_chunk.content + "\n"
-                    elif message_chunk.tool_calls:
-                        # Handle tool call results (e.g., jokes)
-                        for tool_call in message_chunk.tool_calls:
-                            if tool_call["name"] == "get_joke":
-                                # Get the tool result by invoking the chatbot
-                                result = chatbot.invoke(
-                                    {"messages": [message_chunk]},
-                                    config=CONFIG
-                                )["messages"][-1]
-                                if isinstance(result, AIMessage) and result.content:
-                                    try:
-                                        # Parse the tool output (e.g., {"joke": "Why did..."})
-                                        tool_output = json.loads(result.content)
-                                        if "joke" in tool_output and tool_output["joke"]:
-                                            yield tool_output["joke"] + "\n"
-                                        elif "error" in tool_output:
-                                            yield f"Error: {tool_output['error']}\n"
-                                        else:
-                                            yield "No joke found.\n"
-                                    except json.JSONDecodeError:
-                                        # If result isn't JSON, use it directly (fallback)
-                                        yield result.content + "\n"
-                                else:
-                                    yield "No joke found.\n"
+            # Single pass over the turn's events: model tokens plus joke results
+            for event in stream_turn_events(user_input, CONFIG):
+                if event["type"] == "token":
+                    yield event["content"]
+                elif event["type"] == "tool_result" and event["name"] == "get_joke":
+                    yield event["content"] + "\n"
+                elif event["type"] == "error":
+                    yield f"⚠️ {event['error']}"
 
         # Use st.write_stream to display the streamed response
         ai_response = st.write_stream(ai_only_stream)
     
     # Save the AI response to history (join streamed parts)
-    st.session_state["message_history"].append({"role": "assistant", "content": ai_response})
\ No newline at end of file
+    st.session_state["message_history"].append({"role": "assistant", "content": ai_response})
+
+    # Per-turn trace: where this turn's time went (LLM, tools, checkpoints)
+    with st.expander("⏱️ Turn trace"):
+        st.dataframe(get_turn_trace(st.session_state["thread_id"]), use_container_width=True)
\ No newline at end of file
@@ -0,0 +1,190 @@
+"""
+Opt-in semantic cache of final answers, shared across threads.
+
+Many users ask nearly the same question ("weather in London?", "what's the
+weather in london"). With RESPONSE_CACHE_ENABLED=1 the answer of a finished
+turn is stored under its normalized question, and a later question that
+matches it exactly or is similar enough is answered from the cache without
+calling the LLM or any tool.
+
+Similarity uses a local hashing embedding: word unigrams and bigrams are
+hashed into a fixed-size signed vector, so no model is downloaded and an
+index lookup is one matrix-vector product. Numbers in the two questions must
+be identical, so "convert 100 USD" never matches "convert 200 USD".
+
+An entry lives as long as the freshest data behind it allows: the smallest
+freshness TTL of the tools used to produce it (stock quotes a minute,
+weather ten minutes, ...), RESPONSE_CACHE_TTL when no tool was used. Answers
+that used a tool with no freshness entry (e.g. jokes) are not cached. The
+cache holds at most RESPONSE_CACHE_MAX_ENTRIES answers and evicts the least
+recently used one.
+"""
+from collections import OrderedDict
+import numpy as np
+import threading
+import hashlib
+import time
+import re
+import os
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "0").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.9"))
+RESPONSE_CACHE_DIMENSIONS = 512
+
+# Seconds an answer built from each tool's data stays fresh; tools not listed are never cached
+TOOL_FRESHNESS = {
+    "calculator_tool": 86400,
+    "get_stock_price": 60,
+    "get_stock_quotes": 60,
+    "fetch_weather": 600,
+    "fetch_news": 900,
+    "convert_currency": 3600,
+    "convert_currencies": 3600,
+    "duckduckgo_search": 3600,
+    "get_nasa_apod": 21600,
+    "get_ip_location": 86400,
+}
+
+STOP_WORDS = frozenset(
+    "a an the is are was were be of to in on for at by with and or please can could would you me my "
+    "i what what's whats tell give show how much many do does".split()
+)
+# Questions leaning on earlier turns ("what about it?") depend on context the cache cannot see
+REFERENCE_WORDS = frozenset("it its that this those these they them he she him her his there above previous again same".split())
+_TOKEN = re.compile(r"[a-z0-9']+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+def normalize_question(text: str) -> str:
+    return " ".join(_TOKEN.findall(text.lower()))
+
+def is_standalone(text: str) -> bool:
+    """True when the question can be answered without the conversation before it."""
+    words = normalize_question(text).split()
+    return len(words) >= 2 and not REFERENCE_WORDS.intersection(words)
+
+def embed(text: str, dimensions: int = RESPONSE_CACHE_DIMENSIONS) -> np.ndarray:
+    """L2-normalized hashing embedding of the question's content words and word pairs."""
+    words = [w for w in normalize_question(text).split() if w not in STOP_WORDS]
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature in features:
+        digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+        vector[digest % dimensions] += 1.0 if (digest >> 63) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def answer_ttl(tool_names) -> float:
+    """Freshness of an answer produced with these tools (0 means do not cache)."""
+    ttls = [TOOL_FRESHNESS.get(name, 0) for name in tool_names]
+    return min(ttls) if ttls else RESPONSE_CACHE_TTL
+
+class _Entry:
+    def __init__(self, slot: int, namespace: str, question: str, numbers: tuple, answer: str, expires_at: float):
+        self.slot = slot
+        self.namespace = namespace
+        self.question = question
+        self.numbers = numbers
+        self.answer = answer
+        self.expires_at = expires_at
+
+class ResponseCache:
+    """LRU of answers with an exact-match dict and a vector index for near matches."""
+
+    def __init__(self, enabled: bool = RESPONSE_CACHE_ENABLED, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 similarity: float = RESPONSE_CACHE_SIMILARITY, dimensions: int = RESPONSE_CACHE_DIMENSIONS):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.dimensions = dimensions
+        self.entries = OrderedDict()  # (namespace, normalized question) -> _Entry, oldest first
+        self.vectors = np.zeros((max_entries, dimensions), dtype=np.float32)
+        self.slot_keys = [None] * max_entries
+        self.free_slots = list(range(max_entries - 1, -1, -1))
+        self.lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _remove_locked(self, key):
+        entry = self.entries.pop(key)
+        self.vectors[entry.slot] = 0.0
+        self.slot_keys[entry.slot] = None
+        self.free_slots.append(entry.slot)
+
+    def lookup(self, question: str, namespace: str = "") -> str:
+        """The cached answer for question (exact or similar), or None."""
+        if not self.enabled or not is_standalone(question):
+            return None
+        key = (namespace, normalize_question(question))
+        numbers = tuple(_NUMBER.findall(key[1]))
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._remove_locked(key)
+                entry = None
+            if entry is not None:
+                self.exact_hits += 1
+            elif self.entries:
+                scores = self.vectors @ embed(question, self.dimensions)
+                for slot in np.argsort(scores)[::-1][:5]:
+                    if scores[slot] < self.similarity:
+                        break
+                    candidate = self.entries.get(self.slot_keys[slot])
+                    if (candidate is not None and candidate.namespace == namespace
+                            and candidate.numbers == numbers and candidate.expires_at > now):
+                        entry = candidate
+                        self.similar_hits += 1
+                        break
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end((entry.namespace, entry.question))
+            return entry.answer
+
+    def store(self, question: str, answer: str, tool_names=(), namespace: str = ""):
+        """Remember the answer to a standalone question for as long as its tools' data stays fresh."""
+        if not self.enabled or not answer or not is_standalone(question):
+            return
+        ttl = answer_ttl(tool_names)
+        if ttl <= 0:
+            return
+        normalized = normalize_question(question)
+        key = (namespace, normalized)
+        vector = embed(question, self.dimensions)
+        with self.lock:
+            if key in self.entries:
+                self._remove_locked(key)
+            if not self.free_slots:
+                self._remove_locked(next(iter(self.entries)))
+                self.evictions += 1
+            slot = self.free_slots.pop()
+            self.vectors[slot] = vector
+            self.slot_keys[slot] = key
+            self.entries[key] = _Entry(slot, namespace, normalized, tuple(_NUMBER.findall(normalized)), answer, time.time() + ttl)
+            self.stores += 1
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries):
+                self._remove_locked(key)
+
+    def stats(self) -> dict:
+        with self.lock:
+            hits = self.exact_hits + self.similar_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+response_cache = ResponseCache()
@@ -0,0 +1,317 @@
+"""
+Headless serving mode for the chatbot graph.
+
+One HTTP front process hands chat turns to a pool of worker processes, one
+per CPU core by default. Each worker compiles its own graph and shares the
+checkpoint store with the others (SQLite in WAL mode or Postgres via
+CHECKPOINT_URL; memory:// cannot be shared between processes). A thread is
+pinned to a worker by a stable hash of its thread_id, and inside the worker
+turn_control runs turns of one thread one at a time, so two requests for the
+same conversation never race on the checkpointer.
+
+Endpoints (JSON in, JSON or NDJSON out):
+    POST /threads/<thread_id>/turns      {"input": "...", "recursion_limit": 10}
+                                         streams one event per line: token,
+                                         tool_started, tool_result, done
+    GET  /threads?limit=50&offset=0      thread index rows, newest first
+    GET  /threads/<thread_id>/history?limit=30&end=N
+    GET  /threads/<thread_id>/trace      spans of the thread's latest turn
+    GET  /search?q=...&limit=20          ranked full-text hits across threads
+    GET  /healthz
+
+    python server.py --port 8765 --workers 4
+
+Point the Streamlit apps at it with CHATBOT_SERVER_URL=http://127.0.0.1:8765.
+
+The front process answers thread lists, search and history pages itself from
+read-only connections and is the one process that runs the checkpoint
+compaction job (CHECKPOINT_COMPACTION_INTERVAL); workers never start it.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+import multiprocessing
+import threading
+import argparse
+import queue
+import uuid
+import zlib
+import json
+import os
+
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8765"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "0")) or os.cpu_count() or 1
+SERVER_WORKER_THREADS = int(os.getenv("SERVER_WORKER_THREADS", "8"))
+SERVER_RECURSION_LIMIT = int(os.getenv("SERVER_RECURSION_LIMIT", "10"))
+# How often a request waiting for events checks that its worker is still alive
+SERVER_WORKER_POLL_SECONDS = float(os.getenv("SERVER_WORKER_POLL_SECONDS", "1"))
+
+# =========================Worker Process======================
+def run_job(job: dict, emit):
+    """Execute one job inside a worker and emit its events."""
+    import langgraph_tool_backend as backend
+
+    if job["kind"] == "turn":
+        config = {
+            "configurable": {"thread_id": job["thread_id"]},
+            "recursion_limit": job.get("recursion_limit") or SERVER_RECURSION_LIMIT,
+            "metadata": {"thread_id": job["thread_id"]},
+            "run_name": "Chat_turn",
+        }
+        for event in backend.stream_turn_events(job["input"], config):
+            emit(event)
+    elif job["kind"] == "trace":
+        emit({"type": "trace", "spans": backend.get_turn_trace(job["thread_id"])})
+    else:
+        emit({"type": "error", "error": f"Unknown job kind: {job['kind']}"})
+
+def worker_main(index: int, jobs, events):
+    """Worker process loop: run jobs on a thread pool (turns are serialized per thread by turn_control)."""
+    if os.getenv("METRICS_PORT"):
+        # Each worker keeps its own metrics; give it its own port
+        os.environ["METRICS_PORT"] = str(int(os.environ["METRICS_PORT"]) + index)
+    # Compaction runs once, in the front process
+    os.environ["CHECKPOINT_COMPACTION_INTERVAL"] = "0"
+    import langgraph_tool_backend as backend
+
+    backend.get_chatbot()
+
+    def handle(job):
+        emit = lambda event: events.put((job["id"], event))
+        try:
+            run_job(job, emit)
+        except Exception as e:
+            print(f"Error in worker {index}: {e}")
+            emit({"type": "error", "error": str(e)})
+        finally:
+            events.put((job["id"], None))
+
+    with ThreadPoolExecutor(max_workers=SERVER_WORKER_THREADS, thread_name_prefix=f"worker-{index}") as pool:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            pool.submit(handle, job)
+
+# =========================Worker Pool======================
+class WorkerUnavailable(RuntimeError):
+    """The worker process serving a job died before the job finished."""
+
+class WorkerPool:
+    """Worker processes plus a router thread that delivers their events to waiting requests."""
+
+    def __init__(self, workers: int = SERVER_WORKERS):
+        context = multiprocessing.get_context("spawn")
+        self.events = context.Queue()
+        self.job_queues = [context.Queue() for _ in range(workers)]
+        self.processes = [
+            context.Process(target=worker_main, args=(i, jobs, self.events), daemon=True, name=f"chat-worker-{i}")
+            for i, jobs in enumerate(self.job_queues)
+        ]
+        self.pending = {}
+        self.lock = threading.Lock()
+        for process in self.processes:
+            process.start()
+        threading.Thread(target=self._route_events, daemon=True, name="worker-events").start()
+
+    def worker_for(self, thread_id: str) -> int:
+        """Stable thread_id -> worker mapping (same answer in every process and run)."""
+        return zlib.crc32(str(thread_id).encode()) % len(self.job_queues)
+
+    def _route_events(self):
+        while True:
+            job_id, event = self.events.get()
+            with self.lock:
+                inbox = self.pending.get(job_id)
+                if event is None:
+                    self.pending.pop(job_id, None)
+            if inbox is not None:
+                inbox.put(event)
+
+    def submit(self, kind: str, thread_id: str, **payload):
+        """
+        Send a job to the thread's worker and yield its events until the job
+        ends. Raises WorkerUnavailable when that worker process is dead or dies
+        before finishing the job.
+        """
+        index = self.worker_for(thread_id)
+        process = self.processes[index]
+        if not process.is_alive():
+            raise WorkerUnavailable(f"Worker {index} is not running.")
+        job_id = uuid.uuid4().hex
+        inbox = queue.Queue()
+        with self.lock:
+            self.pending[job_id] = inbox
+        self.job_queues[index].put({"id": job_id, "kind": kind, "thread_id": str(thread_id), **payload})
+        try:
+            while True:
+                try:
+                    event = inbox.get(timeout=SERVER_WORKER_POLL_SECONDS)
+                except queue.Empty:
+                    if process.is_alive():
+                        continue
+                    try:
+                        # Events the router had not delivered yet when the worker exited
+                        event = inbox.get(timeout=SERVER_WORKER_POLL_SECONDS)
+                    except queue.Empty:
+                        raise WorkerUnavailable(f"Worker {index} exited before finishing the request.") from None
+                if event is None:
+                    return
+                yield event
+        finally:
+            # A client that disconnects early stops listening; the worker still finishes the turn
+            with self.lock:
+                self.pending.pop(job_id, None)
+
+    def alive(self) -> int:
+        return sum(process.is_alive() for process in self.processes)
+
+    def close(self):
+        for jobs in self.job_queues:
+            jobs.put(None)
+        for process in self.processes:
+            process.join(timeout=10)
+
+# =========================HTTP API======================
+class ChatRequestHandler(BaseHTTPRequestHandler):
+    pool: WorkerPool = None
+
+    def _send_json(self, body, status: int = 200):
+        payload = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return parts, query
+
+    def do_GET(self):
+        try:
+            self._get()
+        except ValueError as e:
+            self._send_json({"error": str(e)}, status=400)
+
+    @staticmethod
+    def _int_param(query: dict, name: str, default=None):
+        """A non-negative integer query parameter; ValueError (sent as 400) when malformed."""
+        if name not in query:
+            return default
+        try:
+            value = int(query[name])
+        except ValueError:
+            raise ValueError(f"'{name}' must be an integer") from None
+        if value < 0:
+            raise ValueError(f"'{name}' must not be negative")
+        return value
+
+    def _get(self):
+        import langgraph_tool_backend as backend
+
+        parts, query = self._route()
+        if parts == ["healthz"]:
+            self._send_json({"status": "ok", "workers": self.pool.alive()})
+        elif parts == ["threads"]:
+            limit = self._int_param(query, "limit", 50)
+            offset = self._int_param(query, "offset", 0)
+            self._send_json(backend.retrieve_thread_summaries(limit=limit, offset=offset))
+        elif parts == ["search"]:
+            self._send_json(backend.search_history(query.get("q", ""), limit=self._int_param(query, "limit", 20)))
+        elif len(parts) == 3 and parts[0] == "threads" and parts[2] == "history":
+            limit = self._int_param(query, "limit", backend.HISTORY_PAGE_SIZE)
+            end = self._int_param(query, "end")
+            messages, start = backend.load_history_page(parts[1], limit=limit, end=end)
+            self._send_json({"messages": messages, "start": start})
+        elif len(parts) == 3 and parts[0] == "threads" and parts[2] == "trace":
+            spans = []
+            try:
+                for event in self.pool.submit("trace", parts[1]):
+                    spans = event.get("spans", spans)
+            except WorkerUnavailable as e:
+                self._send_json({"error": str(e)}, status=503)
+                return
+            self._send_json(spans)
+        else:
+            self._send_json({"error": "Not found"}, status=404)
+
+    def do_POST(self):
+        parts, _ = self._route()
+        if not (len(parts) == 3 and parts[0] == "threads" and parts[2] == "turns"):
+            self._send_json({"error": "Not found"}, status=404)
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            self._send_json({"error": "Body must be JSON"}, status=400)
+            return
+        if not isinstance(body, dict):
+            self._send_json({"error": "Body must be a JSON object"}, status=400)
+            return
+        if not isinstance(body.get("input"), str) or not body["input"].strip():
+            self._send_json({"error": "'input' must be a non-empty string"}, status=400)
+            return
+        recursion_limit = body.get("recursion_limit")
+        if recursion_limit is not None and (not isinstance(recursion_limit, int) or recursion_limit < 1):
+            self._send_json({"error": "'recursion_limit' must be a positive integer"}, status=400)
+            return
+        # No Content-Length: the NDJSON stream ends when the connection closes
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            try:
+                for event in self.pool.submit("turn", parts[1], input=body["input"], recursion_limit=recursion_limit):
+                    self._write_event(event)
+            except WorkerUnavailable as e:
+                # The 200 status is already sent; end the stream with an error event instead
+                self._write_event({"type": "error", "error": str(e)})
+                self._write_event({"type": "done"})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _write_event(self, event: dict):
+        self.wfile.write(json.dumps(event, default=str).encode() + b"\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(host: str = SERVER_HOST, port: int = SERVER_PORT, workers: int = SERVER_WORKERS) -> ThreadingHTTPServer:
+    """Start the worker pool and serve the API until interrupted."""
+    import langgraph_tool_backend as backend
+    from checkpoint_compaction import CHECKPOINT_COMPACTION_INTERVAL, start_compaction_job
+    from checkpoint_store import CHECKPOINT_URL
+
+    pool = WorkerPool(workers)
+    backend.use_read_storage()
+    compaction = None
+    if CHECKPOINT_COMPACTION_INTERVAL and CHECKPOINT_URL.startswith("sqlite:///"):
+        compaction = start_compaction_job(CHECKPOINT_URL[len("sqlite:///"):])
+    handler = type("BoundChatRequestHandler", (ChatRequestHandler,), {"pool": pool})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    print(f"Chat server on http://{host}:{port} with {workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if compaction is not None:
+            compaction.set()
+        pool.close()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the chatbot graph over HTTP with a pool of worker processes.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
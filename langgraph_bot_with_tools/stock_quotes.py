@@ -0,0 +1,123 @@
+"""
+Batched, cached and rate-limited Alpha Vantage quotes.
+
+Alpha Vantage only serves one symbol per GLOBAL_QUOTE request and its free
+tier allows a handful of requests per minute. `get_quotes(symbols)` answers a
+multi-ticker question in one call: symbols are de-duplicated, recent quotes
+come from a short-TTL cache, and the remaining symbols are fetched side by
+side. Every upstream request first takes a token from a client-side token
+bucket, so bursts queue up locally instead of tripping the upstream throttle.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from http_client import http_get
+from tool_cache import cached
+import contextvars
+import threading
+import time
+import os
+
+ALPHA_VANTAGE_URL = os.getenv("ALPHA_VANTAGE_URL", "https://www.alphavantage.co/query")
+QUOTE_CACHE_TTL = float(os.getenv("QUOTE_CACHE_TTL", "60"))
+# Free tier: 5 requests per minute. A rate of 0 disables the limiter.
+ALPHA_VANTAGE_RATE_PER_MINUTE = float(os.getenv("ALPHA_VANTAGE_RATE_PER_MINUTE", "5"))
+ALPHA_VANTAGE_BURST = int(os.getenv("ALPHA_VANTAGE_BURST", "5"))
+ALPHA_VANTAGE_MAX_WAIT = float(os.getenv("ALPHA_VANTAGE_MAX_WAIT", "15"))
+QUOTE_MAX_SYMBOLS = int(os.getenv("QUOTE_MAX_SYMBOLS", "10"))
+QUOTE_MAX_WORKERS = int(os.getenv("QUOTE_MAX_WORKERS", "4"))
+
+# =========================Rate Limiter======================
+class TokenBucket:
+    """Thread-safe token bucket; acquire() waits in line for the next free token."""
+
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate = rate_per_second
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.acquired = 0
+        self.waited = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+
+    def _refill_locked(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout: float = None) -> bool:
+        """
+        Take one token, sleeping until it is available. Returns False without
+        taking a token when it would not be available within `timeout` seconds.
+        """
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self._refill_locked(now)
+            # Reserve the token now (the balance may go negative) so waiters are served in order
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if timeout is not None and wait > timeout:
+                self.rejected += 1
+                return False
+            self.tokens -= 1
+            self.acquired += 1
+            if wait:
+                self.waited += 1
+                self.wait_seconds += wait
+        if wait:
+            time.sleep(wait)
+        return True
+
+    def stats(self) -> dict:
+        with self.lock:
+            self._refill_locked(time.monotonic())
+            return {
+                "tokens": self.tokens,
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "rejected": self.rejected,
+                "wait_seconds": self.wait_seconds,
+            }
+
+quote_limiter = TokenBucket(ALPHA_VANTAGE_RATE_PER_MINUTE / 60, ALPHA_VANTAGE_BURST)
+quote_executor = ThreadPoolExecutor(max_workers=QUOTE_MAX_WORKERS, thread_name_prefix="stock-quote")
+
+# =========================Quotes======================
+def normalize_symbol(symbol: str) -> str:
+    return symbol.strip().upper()
+
+@cached("stock_quote", QUOTE_CACHE_TTL, key_fn=normalize_symbol)
+def fetch_quote(symbol: str) -> dict:
+    """GLOBAL_QUOTE response for one symbol (cached for QUOTE_CACHE_TTL seconds)."""
+    symbol = normalize_symbol(symbol)
+    if not quote_limiter.acquire(timeout=ALPHA_VANTAGE_MAX_WAIT):
+        return {"error": f"Rate limit reached for Alpha Vantage; try {symbol} again shortly."}
+    try:
+        params = {'function': 'GLOBAL_QUOTE', 'symbol': symbol, 'apikey': os.getenv("ALPHA_VANTAGE_API_KEY")}
+        data = http_get(ALPHA_VANTAGE_URL, params=params).json()
+    except Exception as e:
+        return {"error": str(e)}
+    # Throttled or invalid requests come back as 200 with a Note/Information/Error Message body
+    for key in ("Note", "Information", "Error Message"):
+        if key in data:
+            return {"error": data[key]}
+    return data
+
+def get_quotes(symbols) -> dict:
+    """
+    Quotes for several symbols, keyed by normalized symbol in request order.
+    Cached symbols cost nothing; the rest are fetched concurrently behind the rate limiter.
+    """
+    unique = list(dict.fromkeys(normalize_symbol(s) for s in symbols if s and s.strip()))
+    if len(unique) > QUOTE_MAX_SYMBOLS:
+        return {"error": f"At most {QUOTE_MAX_SYMBOLS} symbols per request."}
+    if len(unique) == 1:
+        return {unique[0]: fetch_quote(unique[0])}
+    futures = [
+        (symbol, quote_executor.submit(contextvars.copy_context().run, fetch_quote, symbol))
+        for symbol in unique
+    ]
+    return {symbol: future.result() for symbol, future in futures}
+
+def quote_stats() -> dict:
+    return {"limiter": quote_limiter.stats()}
@@ -0,0 +1,122 @@
+"""
+Thread catalog for the conversation sidebar.
+
+One row per thread (thread_id, created_at, last_updated, message_count, title),
+updated with every checkpoint write, so listing conversations is an indexed,
+paginated query instead of a scan over every stored checkpoint. When the
+catalog shares the PooledSqliteSaver's database, its upsert commits in the
+checkpoint's write batch; otherwise it is applied from the write hook.
+"""
+from langchain_core.messages import HumanMessage
+from checkpoint_store import CHECKPOINT_URL, attach_index, connect_sqlite, execute_statements, is_subgraph_checkpoint, latest_checkpoints
+import threading
+import os
+
+TITLE_MAX_CHARS = 60
+
+def default_index_database(url: str = CHECKPOINT_URL) -> str:
+    """Keep the catalog next to SQLite checkpoints; in memory for memory://."""
+    if url.startswith("sqlite:///"):
+        return url[len("sqlite:///"):]
+    if url.startswith("memory:"):
+        return ":memory:"
+    return "thread_index.db"
+
+THREAD_INDEX_DB = os.getenv("THREAD_INDEX_DB") or default_index_database()
+
+class ThreadIndex:
+    """SQLite-backed catalog of conversation threads ordered by recency."""
+
+    def __init__(self, database: str = THREAD_INDEX_DB):
+        self.database = database
+        self.conn = connect_sqlite(database)
+        self.lock = threading.Lock()
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS thread_index (
+                thread_id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                last_updated TEXT NOT NULL,
+                message_count INTEGER NOT NULL DEFAULT 0,
+                title TEXT
+            );
+            CREATE INDEX IF NOT EXISTS thread_index_last_updated ON thread_index (last_updated DESC);
+            """
+        )
+
+    @staticmethod
+    def _title(messages) -> str:
+        for message in messages:
+            if isinstance(message, HumanMessage) and isinstance(message.content, str):
+                return message.content.strip().replace("\n", " ")[:TITLE_MAX_CHARS]
+        return None
+
+    def checkpoint_statements(self, config, checkpoint, metadata=None) -> list:
+        """The upsert of the thread's row for a checkpoint write, as (many, sql, parameters) statements."""
+        if is_subgraph_checkpoint(config):
+            return []
+        configurable = config["configurable"]
+        messages = checkpoint.get("channel_values", {}).get("messages")
+        count = len(messages) if messages is not None else None
+        title = self._title(messages) if messages else None
+        return [(
+            False,
+            """
+            INSERT INTO thread_index (thread_id, created_at, last_updated, message_count, title)
+            VALUES (?, ?, ?, COALESCE(?, 0), ?)
+            ON CONFLICT(thread_id) DO UPDATE SET
+                last_updated = excluded.last_updated,
+                message_count = COALESCE(?, thread_index.message_count),
+                title = COALESCE(thread_index.title, excluded.title)
+            """,
+            (str(configurable["thread_id"]), checkpoint["ts"], checkpoint["ts"], count, title, count),
+        )]
+
+    def record_checkpoint(self, config, checkpoint, metadata=None):
+        """Checkpoint write hook: upsert the thread's row."""
+        statements = self.checkpoint_statements(config, checkpoint, metadata)
+        with self.lock:
+            execute_statements(self.conn, statements)
+
+    def list_threads(self, limit: int = 50, offset: int = 0) -> list:
+        """Most recently updated threads first."""
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                SELECT thread_id, created_at, last_updated, message_count, title
+                FROM thread_index ORDER BY last_updated DESC LIMIT ? OFFSET ?
+                """,
+                (-1 if limit is None else limit, offset),
+            ).fetchall()
+        keys = ("thread_id", "created_at", "last_updated", "message_count", "title")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def get(self, thread_id: str) -> dict:
+        """The index row for one thread, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                """
+                SELECT thread_id, created_at, last_updated, message_count, title
+                FROM thread_index WHERE thread_id = ?
+                """,
+                (str(thread_id),),
+            ).fetchone()
+        keys = ("thread_id", "created_at", "last_updated", "message_count", "title")
+        return dict(zip(keys, row)) if row else None
+
+    def count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM thread_index").fetchone()[0]
+
+    def remove(self, thread_id: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM thread_index WHERE thread_id = ?", (str(thread_id),))
+
+    def backfill(self, checkpointer):
+        """One-time import of threads written before the index existed."""
+        for checkpoint_tuple in latest_checkpoints(checkpointer):
+            self.record_checkpoint(checkpoint_tuple.config, checkpoint_tuple.checkpoint)
+
+    def attach(self, checkpointer):
+        """Keep this index current with the checkpointer's writes."""
+        return attach_index(self, checkpointer)
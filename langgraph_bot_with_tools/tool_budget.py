@@ -0,0 +1,87 @@
+"""
+Per-turn budget for the chat -> tools loop.
+
+Without a governor the graph keeps alternating between the model and the
+tools until the model stops asking, and the only brake is the frontends'
+recursion_limit, which raises after the LLM calls are already spent. Each
+turn (everything after the latest HumanMessage) is instead limited in
+    * tool calls and tool rounds,
+    * wall-clock time since the turn started,
+    * LLM tokens,
+and when a limit is hit the graph routes to a final-answer step that tells
+the model to answer with what it has, without tools. Tool calls repeating
+an identical earlier call of the same turn are answered from that call's
+result instead of hitting the upstream API again, for tools the registry
+marks idempotent.
+"""
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately
+import json
+import time
+import os
+
+TURN_MAX_TOOL_CALLS = int(os.getenv("TURN_MAX_TOOL_CALLS", "12"))
+TURN_MAX_TOOL_ROUNDS = int(os.getenv("TURN_MAX_TOOL_ROUNDS", "3"))
+TURN_MAX_SECONDS = float(os.getenv("TURN_MAX_SECONDS", "45"))
+TURN_MAX_TOKENS = int(os.getenv("TURN_MAX_TOKENS", "20000"))
+
+FINAL_ANSWER_INSTRUCTIONS = (
+    "The tool budget for this request is used up ({reason}). Do not call any more tools. "
+    "Answer the user now using only the information already gathered, and say briefly "
+    "if something could not be looked up."
+)
+
+def current_turn(messages) -> list:
+    """Messages after the latest HumanMessage."""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i + 1:]
+    return list(messages)
+
+def tool_signature(tool_call: dict) -> str:
+    """Identity of a tool call for repeat detection: name plus canonical arguments."""
+    return tool_call["name"] + ":" + json.dumps(tool_call.get("args") or {}, sort_keys=True, default=str)
+
+def previous_results(messages) -> dict:
+    """Signature -> result content for every tool call already answered in this turn."""
+    turn = current_turn(messages)
+    results_by_id = {
+        message.tool_call_id: message.content
+        for message in turn if getattr(message, "tool_call_id", None) is not None
+    }
+    results = {}
+    for message in turn:
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            if tool_call["id"] in results_by_id:
+                results.setdefault(tool_signature(tool_call), results_by_id[tool_call["id"]])
+    return results
+
+def response_tokens(prompt, response) -> int:
+    """Tokens an LLM call used: provider usage when reported, otherwise an estimate."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage and usage.get("total_tokens"):
+        return usage["total_tokens"]
+    return count_tokens_approximately(list(prompt) + [response])
+
+def budget_exceeded(state, max_tool_calls: int = TURN_MAX_TOOL_CALLS, max_rounds: int = TURN_MAX_TOOL_ROUNDS,
+                    max_seconds: float = TURN_MAX_SECONDS, max_tokens: int = TURN_MAX_TOKENS):
+    """
+    (limit, description) for the first budget the pending tool calls in the
+    last message would break, or None when they fit the turn's budget.
+    """
+    turn = current_turn(state["messages"])
+    requests = [m for m in turn if getattr(m, "tool_calls", None)]
+    if len(requests) > max_rounds:
+        return "tool_rounds", f"more than {max_rounds} tool rounds"
+    if sum(len(m.tool_calls) for m in requests) > max_tool_calls:
+        return "tool_calls", f"more than {max_tool_calls} tool calls"
+    started_at = state.get("turn_started_at")
+    if started_at and time.time() - started_at > max_seconds:
+        return "time", f"over {max_seconds:g}s"
+    if (state.get("turn_tokens") or 0) > max_tokens:
+        return "tokens", f"over {max_tokens} tokens"
+    return None
+
+def final_answer_request(prompt: list, description: str) -> list:
+    """The turn's prompt plus the instruction to stop calling tools and answer."""
+    return list(prompt) + [SystemMessage(content=FINAL_ANSWER_INSTRUCTIONS.format(reason=description))]
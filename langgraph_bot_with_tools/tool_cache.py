@@ -0,0 +1,162 @@
+"""
+TTL result cache for idempotent tools.
+
+Entries live in a size-bounded in-memory LRU with a per-entry TTL. When
+TOOL_CACHE_PATH is set, entries are also written to a small SQLite file so the
+cache survives restarts. Concurrent identical lookups are single-flighted: only
+the first caller hits the upstream API, the others wait for its result.
+"""
+from collections import OrderedDict
+from functools import wraps
+import threading
+import sqlite3
+import json
+import time
+import os
+
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1024"))
+TOOL_CACHE_PATH = os.getenv("TOOL_CACHE_PATH")
+
+class _InFlight:
+    """A fetch in progress that followers can wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class ToolCache:
+    """LRU + TTL cache with an optional on-disk backend and single-flight fetches."""
+
+    def __init__(self, max_entries: int = TOOL_CACHE_MAX_ENTRIES, disk_path: str = None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.disk = None
+        if disk_path:
+            self.disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self.disk.execute(
+                "CREATE TABLE IF NOT EXISTS tool_cache (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)"
+            )
+            self.disk.execute("DELETE FROM tool_cache WHERE expires_at < ?", (time.time(),))
+            self.disk.commit()
+
+    def _get_locked(self, key: str):
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self.entries.move_to_end(key)
+                return True, value
+            del self.entries[key]
+        if self.disk is not None:
+            row = self.disk.execute(
+                "SELECT expires_at, value FROM tool_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and row[0] > time.time():
+                value = json.loads(row[1])
+                self._store_locked(key, value, row[0], persist=False)
+                return True, value
+        return False, None
+
+    def _store_locked(self, key: str, value, expires_at: float, persist: bool = True):
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        if persist and self.disk is not None:
+            self.disk.execute(
+                "INSERT OR REPLACE INTO tool_cache (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, expires_at, json.dumps(value)),
+            )
+            self.disk.commit()
+
+    def get(self, key: str):
+        """Return (hit, value) for a key."""
+        with self.lock:
+            return self._get_locked(key)
+
+    def set(self, key: str, value, ttl: float):
+        with self.lock:
+            self._store_locked(key, value, time.time() + ttl)
+
+    def get_or_compute(self, key: str, ttl: float, compute, should_cache=None):
+        """
+        Return the cached value for key, or call compute() once to produce it.
+        Callers that arrive while compute() is running share its result.
+        """
+        with self.lock:
+            hit, value = self._get_locked(key)
+            if hit:
+                self.hits += 1
+                return value
+            call = self.inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _InFlight()
+                self.inflight[key] = call
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            value = compute()
+            call.value = value
+            if should_cache is None or should_cache(value):
+                self.set(key, value, ttl)
+            return value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+            call.event.set()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.disk is not None:
+                self.disk.execute("DELETE FROM tool_cache")
+                self.disk.commit()
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+tool_cache = ToolCache(disk_path=TOOL_CACHE_PATH)
+
+def _is_cacheable(result) -> bool:
+    return not (isinstance(result, dict) and "error" in result)
+
+def cached(namespace: str, ttl: float, key_fn=None, cache: ToolCache = None):
+    """
+    Cache a function's return value for `ttl` seconds.
+    Results carrying an "error" key are never cached. Place it under @tool so
+    the tool schema is still built from the original signature.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            parts = key_fn(*args, **kwargs) if key_fn else {"args": args, "kwargs": kwargs}
+            key = f"{namespace}:{json.dumps(parts, sort_keys=True, default=str)}"
+            return (cache or tool_cache).get_or_compute(
+                key, ttl, lambda: func(*args, **kwargs), should_cache=_is_cacheable
+            )
+        return wrapper
+    return decorator
@@ -0,0 +1,160 @@
+"""
+Speculative tool prefetch.
+
+A tool call normally starts only after the model's complete response has
+been streamed and the graph has hopped from chat_node to tools_node. For
+requests whose tool call is easy to predict, TOOL_PREFETCH=1 starts the
+call as soon as the user's message arrives, in parallel with the LLM:
+    * calls produced by the intent router's fast path (jokes) are known
+      exactly and start before the graph leaves chat_node,
+    * simple patterns guess calls for LLM-routed requests ("weather in
+      Paris" -> fetch_weather(city="Paris"), "any good jokes?" -> get_joke).
+When the model asks for the same call (same tool, same arguments ignoring
+case), tools_node takes the prefetched result instead of starting it again.
+Guesses the model did not ask for are cancelled when the response arrives;
+one already running is left to finish and its result is dropped. Only
+read-only tools are ever predicted.
+"""
+from instrumentation import metrics
+import threading
+import json
+import time
+import re
+import os
+
+TOOL_PREFETCH_ENABLED = os.getenv("TOOL_PREFETCH", "0").lower() in ("1", "true", "yes")
+TOOL_PREFETCH_MAX_AGE = float(os.getenv("TOOL_PREFETCH_MAX_AGE", "60"))
+
+_WEATHER = re.compile(
+    r"\b(?:weather|temperature|forecast)\b[^?.!]*?\b(?:in|for|at)\s+(?P<city>[a-z][a-z .'-]*?)"
+    r"(?:\s+(?:today|tonight|now|right now|please))?\s*[?.!]*$",
+    re.IGNORECASE,
+)
+_JOKE = re.compile(r"\bjokes?\b", re.IGNORECASE)
+
+def predict_weather(text: str):
+    match = _WEATHER.search(text)
+    if match is None:
+        return None
+    return {"city": match.group("city").strip().title()}
+
+def predict_joke(text: str):
+    return {"category": "Any"} if _JOKE.search(text) else None
+
+# tool name -> predictor(text) returning the call's args, or None when it does not apply
+PREDICTORS = {
+    "fetch_weather": predict_weather,
+    "get_joke": predict_joke,
+}
+
+def register_predictor(tool_name: str, predictor):
+    """Prefetch tool_name when predictor(user_text) returns arguments. Only for tools without side effects."""
+    PREDICTORS[tool_name] = predictor
+
+def prefetch_key(tool_call: dict) -> str:
+    """Tool name plus arguments, with string values compared case-insensitively."""
+    args = {
+        key: value.strip().lower() if isinstance(value, str) else value
+        for key, value in (tool_call.get("args") or {}).items()
+    }
+    return tool_call["name"] + ":" + json.dumps(args, sort_keys=True, default=str)
+
+def predict_tool_calls(text: str, available) -> list:
+    """Tool calls the user's text makes likely, limited to tools in `available`."""
+    calls = []
+    for name, predictor in PREDICTORS.items():
+        if name not in available:
+            continue
+        try:
+            args = predictor(text)
+        except Exception as e:
+            print(f"Error in tool prefetch predictor {name}: {e}")
+            continue
+        if args is not None:
+            calls.append({"name": name, "args": args, "id": f"prefetch_{name}"})
+    return calls
+
+class ToolPrefetcher:
+    """In-flight speculative calls per thread, claimed by tools_node or cancelled."""
+
+    def __init__(self, enabled: bool = TOOL_PREFETCH_ENABLED, max_age: float = TOOL_PREFETCH_MAX_AGE):
+        self.enabled = enabled
+        self.max_age = max_age
+        self.pending = {}  # thread_id -> {prefetch_key: (tool_name, future, started_at)}
+        self.lock = threading.Lock()
+        self.started = 0
+        self.used = 0
+        self.wasted = 0
+
+    def _drop(self, name: str, future, outcome: str):
+        future.cancel()
+        self.wasted += 1
+        metrics.inc("tool_prefetch_total", name=name, outcome=outcome)
+
+    def start(self, thread_id, tool_calls: list, submit):
+        """
+        Start tool_calls for thread_id with submit(tool_call) -> Future,
+        replacing whatever the thread still had pending from an earlier turn.
+        """
+        if not self.enabled:
+            return
+        thread_id = str(thread_id)
+        with self.lock:
+            for name, future, _ in self.pending.pop(thread_id, {}).values():
+                self._drop(name, future, "stale")
+            if not tool_calls:
+                return
+            started = {}
+            for tool_call in tool_calls:
+                key = prefetch_key(tool_call)
+                if key not in started:
+                    started[key] = (tool_call["name"], submit(tool_call), time.monotonic())
+                    self.started += 1
+            self.pending[thread_id] = started
+
+    def settle(self, thread_id, requested: list):
+        """Keep prefetches matching the model's requested calls and cancel the rest."""
+        if not self.enabled:
+            return
+        wanted = {prefetch_key(tool_call) for tool_call in requested or []}
+        with self.lock:
+            pending = self.pending.get(str(thread_id))
+            if not pending:
+                return
+            for key in [key for key in pending if key not in wanted]:
+                name, future, _ = pending.pop(key)
+                self._drop(name, future, "cancelled")
+            if not pending:
+                del self.pending[str(thread_id)]
+
+    def claim(self, thread_id, tool_call: dict):
+        """The prefetched future for an identical call, or None. A claimed future is removed."""
+        if not self.enabled:
+            return None
+        with self.lock:
+            pending = self.pending.get(str(thread_id))
+            if not pending:
+                return None
+            entry = pending.pop(prefetch_key(tool_call), None)
+            if not pending:
+                del self.pending[str(thread_id)]
+            if entry is None:
+                return None
+            name, future, started_at = entry
+            if time.monotonic() - started_at > self.max_age:
+                self._drop(name, future, "expired")
+                return None
+            self.used += 1
+        metrics.inc("tool_prefetch_total", name=name, outcome="used")
+        return future
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "pending": sum(len(calls) for calls in self.pending.values()),
+                "started": self.started,
+                "used": self.used,
+                "wasted": self.wasted,
+            }
+
+tool_prefetcher = ToolPrefetcher()
@@ -0,0 +1,162 @@
+"""
+Name-indexed tool registry.
+
+Tools are looked up by name in a dict instead of scanning the tool list on
+every call. Each tool's JSON schema is built once at registration and reused
+for `bind_tools`, arguments are validated against the tool's args schema
+before it runs, and a call to an unknown tool gets an error result so the
+model is never left waiting for an answer. Every tool may have its own
+timeout and a cap on how many of its calls run at once.
+
+Tools can be added without editing the backend:
+    * entry points in the "langgraph_chatbot.tools" group,
+    * TOOL_PLUGINS="package.module:attr,other.module" (the attribute, or the
+      module's `TOOLS`, may be a tool, a list of tools, or a function that
+      takes the registry and registers tools itself).
+Per-tool limits come from TOOL_TIMEOUTS="get_stock_quotes=30,fetch_news=10"
+and TOOL_CONCURRENCY="get_stock_price=2".
+
+A tool is idempotent when identical calls may share one result (lookups,
+arithmetic). Only those are deduplicated; tools returning random or
+per-call data (jokes) are not. Mark a tool with `idempotent=True` when
+registering it, in the registry's `idempotent` names, or in its metadata
+(`tool.metadata = {"idempotent": True}`).
+"""
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import BaseModel, ValidationError
+from importlib import import_module, metadata
+import threading
+import hashlib
+import os
+
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "20"))
+TOOL_PLUGINS = os.getenv("TOOL_PLUGINS", "")
+TOOL_ENTRY_POINT_GROUP = "langgraph_chatbot.tools"
+
+def _parse_overrides(value: str, cast) -> dict:
+    overrides = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, setting = item.split("=", 1)
+            overrides[name.strip()] = cast(setting)
+    return overrides
+
+TOOL_TIMEOUTS = _parse_overrides(os.getenv("TOOL_TIMEOUTS", ""), float)
+TOOL_CONCURRENCY = _parse_overrides(os.getenv("TOOL_CONCURRENCY", ""), int)
+
+class ToolSpec:
+    """A registered tool with its precomputed schema and execution limits."""
+
+    def __init__(self, tool, timeout: float, max_concurrency: int = None, idempotent: bool = False):
+        self.tool = tool
+        self.name = tool.name
+        self.timeout = timeout
+        self.idempotent = idempotent
+        self.schema = convert_to_openai_tool(tool)
+        self.slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+    def validate(self, args) -> str:
+        """An error message when args do not fit the tool's argument schema, else None."""
+        args_schema = self.tool.args_schema
+        if not isinstance(args, dict):
+            return f"arguments must be an object, got {type(args).__name__}"
+        if isinstance(args_schema, type) and issubclass(args_schema, BaseModel):
+            try:
+                args_schema.model_validate(args)
+            except ValidationError as e:
+                return "; ".join(
+                    f"{'.'.join(str(part) for part in error['loc']) or 'args'}: {error['msg']}" for error in e.errors()
+                )
+        return None
+
+class ToolRegistry:
+    """Tools by name, with cached schemas for binding to the model."""
+
+    def __init__(self, tools=(), default_timeout: float = TOOL_CALL_TIMEOUT, idempotent=()):
+        self.default_timeout = default_timeout
+        self.idempotent_names = frozenset(idempotent)
+        self.specs = {}
+        self._schemas = None
+        self.lock = threading.Lock()
+        for tool in tools:
+            self.register(tool)
+
+    def register(self, tool, timeout: float = None, max_concurrency: int = None, idempotent: bool = None):
+        """Add or replace a tool. Env overrides win over the arguments."""
+        if idempotent is None:
+            idempotent = tool.name in self.idempotent_names or bool((tool.metadata or {}).get("idempotent"))
+        spec = ToolSpec(
+            tool,
+            timeout=TOOL_TIMEOUTS.get(tool.name, timeout or self.default_timeout),
+            max_concurrency=TOOL_CONCURRENCY.get(tool.name, max_concurrency),
+            idempotent=idempotent,
+        )
+        with self.lock:
+            self.specs[tool.name] = spec
+            self._schemas = None
+        return tool
+
+    def get(self, name: str) -> ToolSpec:
+        return self.specs.get(name)
+
+    @property
+    def tools(self) -> list:
+        return [spec.tool for spec in self.specs.values()]
+
+    @property
+    def names(self) -> list:
+        return list(self.specs)
+
+    def schemas(self) -> list:
+        """OpenAI-format tool schemas, built once per registry change."""
+        with self.lock:
+            if self._schemas is None:
+                self._schemas = [spec.schema for spec in self.specs.values()]
+            return self._schemas
+
+    def fingerprint(self) -> str:
+        """Short hash of the registered tool names, for caches that depend on the toolset."""
+        return hashlib.sha1(",".join(sorted(self.specs)).encode()).hexdigest()[:12]
+
+    def timeout_for(self, name: str) -> float:
+        spec = self.specs.get(name)
+        return spec.timeout if spec else self.default_timeout
+
+    def check(self, tool_call: dict):
+        """(spec, None) when the call can run, or (spec or None, error message)."""
+        spec = self.specs.get(tool_call["name"])
+        if spec is None:
+            return None, f"Unknown tool '{tool_call['name']}'. Available tools: {', '.join(self.names)}"
+        problem = spec.validate(tool_call.get("args") or {})
+        if problem:
+            return spec, f"Invalid arguments for {spec.name}: {problem}"
+        return spec, None
+
+    # =========================Plugins======================
+    def add_plugin(self, plugin):
+        """Register a tool, a list of tools, or call a `register(registry)` hook."""
+        if isinstance(plugin, (list, tuple)):
+            for item in plugin:
+                self.add_plugin(item)
+        elif hasattr(plugin, "name") and hasattr(plugin, "invoke"):
+            self.register(plugin)
+        elif callable(plugin):
+            plugin(self)
+        else:
+            raise TypeError(f"Unsupported tool plugin: {plugin!r}")
+
+    def load_plugins(self, specs: str = TOOL_PLUGINS, group: str = TOOL_ENTRY_POINT_GROUP):
+        """Load tools from entry points and from the TOOL_PLUGINS list."""
+        for entry_point in metadata.entry_points(group=group):
+            try:
+                self.add_plugin(entry_point.load())
+            except Exception as e:
+                print(f"Error loading tool plugin {entry_point.name}: {e}")
+        for spec in filter(None, (s.strip() for s in specs.split(","))):
+            module_name, _, attribute = spec.partition(":")
+            try:
+                module = import_module(module_name)
+                self.add_plugin(getattr(module, attribute or "TOOLS"))
+            except Exception as e:
+                print(f"Error loading tool plugin {spec}: {e}")
+        return self
@@ -0,0 +1,90 @@
+"""
+Result shaping for tool outputs before they enter the message list.
+
+Every tool result is stored in the conversation state, re-sent to the LLM on
+the following steps and re-serialized into each checkpoint, so it is kept
+small on the way in:
+    * per-tool projections keep only the fields the model needs (e.g. the
+      price fields of an Alpha Vantage GLOBAL_QUOTE instead of the whole
+      response),
+    * results are encoded as compact JSON,
+    * the encoded text is capped at TOOL_RESULT_MAX_CHARS (per-tool overrides
+      in TOOL_RESULT_LIMITS="duckduckgo_search=1500") with a visible
+      truncation marker.
+"""
+import json
+import os
+
+TOOL_RESULT_MAX_CHARS = int(os.getenv("TOOL_RESULT_MAX_CHARS", "2000"))
+TOOL_RESULT_LIMITS = {
+    name.strip(): int(limit)
+    for name, _, limit in (item.partition("=") for item in os.getenv("TOOL_RESULT_LIMITS", "").split(","))
+    if limit
+}
+NEWS_MAX_HEADLINES = int(os.getenv("NEWS_MAX_HEADLINES", "5"))
+
+# =========================Projections======================
+QUOTE_FIELDS = {
+    "01. symbol": "symbol",
+    "05. price": "price",
+    "09. change": "change",
+    "10. change percent": "change_percent",
+    "06. volume": "volume",
+    "07. latest trading day": "latest_trading_day",
+}
+
+def project_quote(data: dict) -> dict:
+    """The price fields of a GLOBAL_QUOTE response (anything else is passed through)."""
+    quote = data.get("Global Quote") if isinstance(data, dict) else None
+    if not quote:
+        return data
+    return {short: quote[field] for field, short in QUOTE_FIELDS.items() if field in quote}
+
+def project_quotes(data: dict) -> dict:
+    if not isinstance(data, dict) or "quotes" not in data:
+        return data
+    return {"quotes": {symbol: project_quote(quote) for symbol, quote in data["quotes"].items()}}
+
+def project_news(data: dict) -> dict:
+    if isinstance(data, dict) and "headlines" in data:
+        return {"headlines": data["headlines"][:NEWS_MAX_HEADLINES]}
+    return data
+
+PROJECTIONS = {
+    "get_stock_price": project_quote,
+    "get_stock_quotes": project_quotes,
+    "fetch_news": project_news,
+}
+
+def register_projection(tool_name: str, projection):
+    """Shape results of a (plugin) tool with projection(result) -> result."""
+    PROJECTIONS[tool_name] = projection
+
+# =========================Encoding======================
+def compact_json(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+def cap_text(text: str, limit: int) -> str:
+    """text cut to `limit` characters with a marker saying how much was dropped."""
+    if limit <= 0 or len(text) <= limit:
+        return text
+    return text[:limit] + f" …[truncated {len(text) - limit} chars]"
+
+def shape_tool_result(tool_name: str, result) -> str:
+    """
+    Message content for a raw tool result: projected, compactly encoded and
+    size-capped. Jokes are stored as plain text and errors as "Error: ...".
+    """
+    if isinstance(result, dict):
+        if "error" in result:
+            content = f"Error: {result['error']}"
+        elif "joke" in result:
+            content = result["joke"]
+        else:
+            projection = PROJECTIONS.get(tool_name)
+            content = compact_json(projection(result) if projection else result)
+    elif isinstance(result, str):
+        content = result
+    else:
+        content = compact_json(result)
+    return cap_text(content, TOOL_RESULT_LIMITS.get(tool_name, TOOL_RESULT_MAX_CHARS))
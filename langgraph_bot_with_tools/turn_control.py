@@ -0,0 +1,162 @@
+"""
+Per-thread turn serialization and request coalescing.
+
+Two turns on the same thread_id must not run at once: both would fork from
+the same checkpoint and one branch of the conversation would be lost. The
+TurnController keeps a small slot per active thread (there is no global lock
+around graph work):
+    * a turn for a busy thread waits in that thread's queue ("queue" policy,
+      up to TURN_MAX_QUEUE waiters and TURN_QUEUE_TIMEOUT seconds) or is
+      refused straight away ("reject" policy),
+    * a turn whose input is identical to one already running or queued on the
+      same thread (a double submit, a second browser tab) does not run again;
+      it replays and follows the events of the original,
+and exposes queue depth, rejections and coalesced turns as metrics.
+"""
+from instrumentation import metrics
+import threading
+import time
+import os
+
+TURN_POLICY = os.getenv("TURN_POLICY", "queue")  # "queue" or "reject"
+TURN_MAX_QUEUE = int(os.getenv("TURN_MAX_QUEUE", "4"))
+TURN_QUEUE_TIMEOUT = float(os.getenv("TURN_QUEUE_TIMEOUT", "60"))
+
+class TurnRejected(RuntimeError):
+    """The thread is busy and the turn was not queued."""
+
+class _SharedTurn:
+    """Events of one turn, recorded so coalesced duplicates can replay and follow them."""
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def publish(self, event):
+        with self.cond:
+            self.events.append(event)
+            self.cond.notify_all()
+
+    def finish(self, error: Exception = None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    def follow(self):
+        position = 0
+        while True:
+            with self.cond:
+                while position >= len(self.events) and not self.done:
+                    self.cond.wait()
+                batch = self.events[position:]
+                position = len(self.events)
+                done, error = self.done, self.error
+            yield from batch
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+class _ThreadSlot:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = False
+        self.waiting = 0
+        self.turns = {}  # normalized input -> _SharedTurn, running or queued
+
+class TurnController:
+    """Runs at most one turn per thread at a time; see the module docstring."""
+
+    def __init__(self, policy: str = TURN_POLICY, max_queue: int = TURN_MAX_QUEUE, queue_timeout: float = TURN_QUEUE_TIMEOUT):
+        self.policy = policy
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.slots = {}
+        self.guard = threading.Lock()  # protects self.slots and slot bookkeeping only, never held during a turn
+        self.rejected = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def _release_locked(self, thread_id: str, slot: _ThreadSlot, key: str, turn: _SharedTurn):
+        if turn is not None and slot.turns.get(key) is turn:
+            del slot.turns[key]
+        if not slot.active and not slot.waiting and not slot.turns:
+            self.slots.pop(thread_id, None)
+
+    def run(self, thread_id, user_input: str, produce):
+        """
+        Yield the events of produce() (a zero-argument generator function that
+        runs the turn) once the thread is free, or follow an identical turn
+        already in flight. Raises TurnRejected when the thread is busy and the
+        turn cannot be queued.
+        """
+        thread_id = str(thread_id)
+        key = " ".join(user_input.split())
+        with self.guard:
+            slot = self.slots.setdefault(thread_id, _ThreadSlot())
+            turn = slot.turns.get(key)
+            following = turn is not None
+            if following:
+                self.coalesced += 1
+                metrics.inc("turns_coalesced_total")
+            else:
+                busy = slot.active or slot.waiting
+                if busy and (self.policy == "reject" or slot.waiting >= self.max_queue):
+                    self.rejected += 1
+                    metrics.inc("turns_rejected_total", reason=self.policy if self.policy == "reject" else "queue_full")
+                    self._release_locked(thread_id, slot, key, None)
+                    raise TurnRejected("This conversation is still answering a previous message. Please wait and try again.")
+                turn = _SharedTurn()
+                slot.turns[key] = turn
+                slot.waiting += 1
+        if following:
+            yield from turn.follow()
+            return
+
+        started = time.perf_counter()
+        acquired = slot.lock.acquire(timeout=self.queue_timeout)
+        with self.guard:
+            slot.waiting -= 1
+            if acquired:
+                slot.active = True
+            else:
+                self.timeouts += 1
+                self._release_locked(thread_id, slot, key, turn)
+        metrics.observe("turn_queue_wait_ms", (time.perf_counter() - started) * 1000)
+        if not acquired:
+            metrics.inc("turns_rejected_total", reason="queue_timeout")
+            error = TurnRejected(f"Timed out after {self.queue_timeout:g}s waiting for the previous message in this conversation.")
+            turn.finish(error)
+            raise error
+
+        try:
+            for event in produce():
+                turn.publish(event)
+                yield event
+            turn.finish()
+        except BaseException as e:
+            turn.finish(e if isinstance(e, Exception) else TurnRejected("The original turn was cancelled."))
+            raise
+        finally:
+            with self.guard:
+                slot.active = False
+                self._release_locked(thread_id, slot, key, turn)
+            slot.lock.release()
+
+    def stats(self) -> dict:
+        with self.guard:
+            depths = [slot.waiting for slot in self.slots.values()]
+            return {
+                "threads": len(self.slots),
+                "active": sum(slot.active for slot in self.slots.values()),
+                "queued": sum(depths),
+                "max_queue_depth": max(depths, default=0),
+                "rejected": self.rejected,
+                "coalesced": self.coalesced,
+                "timeouts": self.timeouts,
+            }
+
+turn_controller = TurnController()
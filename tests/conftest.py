@@ -0,0 +1,5 @@
+import sys
+import os
+
+# The backend modules import each other by top-level name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "langgraph_bot_with_tools"))
@@ -0,0 +1,36 @@
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from checkpoint_compaction import _connect, archive_cold_threads, restore_thread
+from checkpoint_store import PooledSqliteSaver
+from history_search import HistorySearch
+from thread_index import ThreadIndex
+
+def write_thread(saver, thread_id: str, text: str):
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"messages": [HumanMessage(content=text)]}
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    saver.put(config, checkpoint, {"source": "input", "step": 0}, {})
+
+def test_archive_restore_round_trip_lists_and_searches_thread(tmp_path):
+    database = str(tmp_path / "chatbot.db")
+    saver = PooledSqliteSaver(database)
+    ThreadIndex(database).attach(saver)
+    HistorySearch(database).attach(saver)
+    write_thread(saver, "cold-thread", "Plan a trip to Kyoto")
+    saver.close()
+    assert [row["thread_id"] for row in ThreadIndex(database).list_threads()] == ["cold-thread"]
+
+    conn = _connect(database)
+    try:
+        archived = archive_cold_threads(conn, archive_after_days=-1, archive_dir=str(tmp_path / "archive"))
+    finally:
+        conn.close()
+    assert archived == ["cold-thread"]
+    assert ThreadIndex(database).list_threads() == []
+    assert HistorySearch(database).search("kyoto") == []
+
+    assert restore_thread(database, str(tmp_path / "archive" / "cold-thread.jsonl.gz")) > 0
+    rows = ThreadIndex(database).list_threads()
+    assert [row["thread_id"] for row in rows] == ["cold-thread"]
+    assert rows[0]["title"] == "Plan a trip to Kyoto"
+    assert [hit["thread_id"] for hit in HistorySearch(database).search("kyoto")] == ["cold-thread"]
@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from checkpoint_store import GroupCommitWriter, PooledSqliteSaver, connect_sqlite
+from thread_index import ThreadIndex
+import threading
+import sqlite3
+import pytest
+
+def write_thread(saver, thread_id: str, text: str):
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"messages": [HumanMessage(content=text)]}
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    return saver.put(config, checkpoint, {"source": "input", "step": 0}, {})
+
+def latest(saver, thread_id: str):
+    return saver.get_tuple({"configurable": {"thread_id": thread_id}})
+
+@pytest.fixture
+def writer(tmp_path):
+    conn = connect_sqlite(str(tmp_path / "writer.db"))
+    conn.execute("CREATE TABLE items (name TEXT PRIMARY KEY)")
+    writer = GroupCommitWriter(conn)
+    yield writer
+    writer.close()
+    conn.close()
+
+def insert(name: str) -> list:
+    return [(False, "INSERT INTO items (name) VALUES (?)", (name,))]
+
+def test_writer_commits_everything_queued_during_a_commit_in_one_batch(writer):
+    holding, release = threading.Event(), threading.Event()
+
+    def hold():
+        holding.set()
+        return release.wait(5)
+
+    writer.conn.create_function("hold", 0, hold)
+    first = writer.submit([(False, "SELECT hold()", ())])
+    assert holding.wait(5)
+    queued = [writer.submit(insert(f"item-{i}")) for i in range(5)]
+    release.set()
+    for future in [first] + queued:
+        future.result(timeout=5)
+    assert writer.transactions == 6
+    assert writer.batches == 2
+
+def test_failing_transaction_rolls_back_alone(writer, tmp_path):
+    ok, failing, after = writer.submit_group([
+        insert("kept"),
+        insert("rolled-back") + insert("kept"),  # second statement violates the primary key
+        insert("also-kept"),
+    ])
+    ok.result(timeout=5)
+    after.result(timeout=5)
+    with pytest.raises(sqlite3.IntegrityError):
+        failing.result(timeout=5)
+    rows = connect_sqlite(str(tmp_path / "writer.db")).execute("SELECT name FROM items ORDER BY name").fetchall()
+    assert rows == [("also-kept",), ("kept",)]
+    assert writer.batches == 1
+
+def test_writes_are_visible_to_other_threads_readers(tmp_path):
+    saver = PooledSqliteSaver(str(tmp_path / "chatbot.db"))
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        pool.submit(write_thread, saver, "t1", "first").result()
+        assert pool.submit(latest, saver, "t1").result() is not None
+        write_thread(saver, "t1", "second")
+        seen = pool.submit(latest, saver, "t1").result()
+        listed = pool.submit(lambda: list(saver.list({"configurable": {"thread_id": "t1"}}))).result()
+    assert seen.checkpoint["channel_values"]["messages"][0].content == "second"
+    assert len(listed) == 2
+    saver.close()
+
+def test_index_statements_commit_in_the_checkpoints_batch(tmp_path):
+    database = str(tmp_path / "chatbot.db")
+    saver = PooledSqliteSaver(database)
+    index = ThreadIndex(database).attach(saver)
+    write_thread(saver, "t1", "Plan a trip to Kyoto")
+    assert (saver.writer.batches, saver.writer.transactions) == (1, 2)
+    assert index.get("t1")["title"] == "Plan a trip to Kyoto"
+
+    saver.add_put_statements(lambda config, checkpoint, metadata: [(False, "INSERT INTO missing_table VALUES (1)", ())])
+    write_thread(saver, "t2", "Still saved")
+    assert latest(saver, "t2") is not None
+    assert index.get("t2") is None  # the failing savepoint took the index rows with it
+    saver.close()
+
+def test_concurrent_puts_from_many_threads(tmp_path):
+    database = str(tmp_path / "chatbot.db")
+    saver = PooledSqliteSaver(database)
+    index = ThreadIndex(database).attach(saver)
+
+    def session(n: int):
+        for turn in range(10):
+            write_thread(saver, f"thread-{n}", f"turn {turn}")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(session, range(8)))
+    assert index.count() == 8
+    assert all(len(list(saver.list({"configurable": {"thread_id": f"thread-{n}"}}))) == 10 for n in range(8))
+    assert saver.writer.transactions == 2 * 80
+    assert saver.writer.batches <= 80
+    saver.close()
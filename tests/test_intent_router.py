@@ -0,0 +1,46 @@
+import pytest
+from intent_router import DEFAULT_RULES, IntentRouter
+
+def joke_calls(text):
+    routed = IntentRouter(DEFAULT_RULES).route(text)
+    if routed is None:
+        return None
+    name, message = routed
+    assert name == "joke"
+    return message.tool_calls
+
+@pytest.mark.parametrize(
+    "text, count",
+    [
+        ("tell me a joke", 1),
+        ("tell me two jokes", 2),
+        ("give us 4 more jokes", 4),
+        ("another joke", 1),
+        ("tell me jokes", 3),
+        ("jokes please", 3),
+        ("3 jokes", 3),
+        ("share 50 jokes", 10),
+    ],
+)
+def test_joke_requests_are_routed(text, count):
+    calls = joke_calls(text)
+    assert calls is not None
+    assert len(calls) == count
+    assert all(call["name"] == "get_joke" for call in calls)
+
+def test_joke_category_is_kept():
+    calls = joke_calls("tell me 2 pun jokes")
+    assert [call["args"]["category"] for call in calls] == ["Pun", "Pun"]
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "I didn't like those two jokes",
+        "tell me 0 jokes",
+        "0 jokes",
+        "what makes a joke funny?",
+        "are your jokes always this bad",
+    ],
+)
+def test_other_mentions_of_jokes_reach_the_llm(text):
+    assert joke_calls(text) is None
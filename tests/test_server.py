@@ -0,0 +1,26 @@
+from http.server import ThreadingHTTPServer
+import threading
+import json
+import pytest
+import requests
+from server import ChatRequestHandler
+
+@pytest.fixture
+def base_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChatRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.mark.parametrize("body", [b"[]", b'"hi"', b"not json", b"\xff", b'{"input": 1}', b'{"input": "hi", "recursion_limit": "x"}'])
+def test_turn_rejects_malformed_bodies(base_url, body):
+    response = requests.post(f"{base_url}/threads/t1/turns", data=body, timeout=5)
+    assert response.status_code == 400
+    assert "error" in response.json()
+
+@pytest.mark.parametrize("path", ["/threads?limit=abc", "/threads?offset=-1", "/search?q=x&limit=ten", "/threads/t1/history?end=x"])
+def test_get_rejects_malformed_integers(base_url, path):
+    response = requests.get(base_url + path, timeout=5)
+    assert response.status_code == 400
+    assert json.loads(response.content)["error"]